@@ -1,11 +1,25 @@
 import asyncio
+import atexit
+import inspect
 import json
 import logging
+import logging.handlers
 import os
+import queue
 import sys
 import base64
+import collections
+import re
+import threading
 import time
-import openai
+import uuid
+import weakref
+from functools import lru_cache
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 import oci
 from openai import OpenAI
 from oci.ai_vision import AIServiceVisionClient
@@ -14,36 +28,544 @@ from playwright.async_api import async_playwright
 from playwright.async_api import Page
 from oci.addons.adk import AgentClient, Agent, tool
 
-# Import configuration
-import importlib.util
-spec = importlib.util.spec_from_file_location("config_AGENT", "config_AGENT.py")
-l_env = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(l_env)
+
+_StackFrame = collections.namedtuple("_StackFrame", "frame filename lineno function code_context index")
+
+
+class _ShortStackInspect:
+    """inspect stand-in whose stack() walks frames without reading source; the rest is the real module"""
+
+    def __init__(self, playwright_dir):
+        self._playwright_dir = playwright_dir
+
+    @staticmethod
+    def _frame_info(frame):
+        return _StackFrame(frame, frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name, None, None)
+
+    def stack(self, context=1):
+        """
+        Return only the frames Playwright reads: the outermost Playwright frame of the API
+        call, which names it (e.g. "Locator.click"), and the caller's frame that made it
+        """
+        frame = sys._getframe(1)
+        api_frame = None
+        while frame is not None:
+            if frame.f_code.co_filename.startswith(self._playwright_dir):
+                api_frame = frame
+            elif api_frame is not None:
+                return [self._frame_info(api_frame), self._frame_info(frame)]
+            frame = frame.f_back
+        return [self._frame_info(api_frame)] if api_frame is not None else []
+
+    def __getattr__(self, name):
+        return getattr(inspect, name)
+
+
+def _disable_playwright_stack_capture():
+    """
+    Playwright calls inspect.stack() on every API call only to name the call and the
+    caller's location in errors, and inspect.stack() reads source lines for every frame.
+    Swap it out in Playwright's connection module alone for a walk that returns just those
+    two frames; errors still read "Locator.click: Timeout ..." with the caller's file and
+    line, only the outer user frames are dropped. Set PW_INSPECT_STACK=1 to keep it.
+    """
+    if os.getenv("PW_INSPECT_STACK"):
+        return
+    try:
+        import playwright
+        from playwright._impl import _connection
+    except ImportError:
+        return
+    if getattr(_connection, "inspect", None) is inspect:
+        _connection.inspect = _ShortStackInspect(os.path.dirname(playwright.__file__))
+
+
+_disable_playwright_stack_capture()
+
+# Import configuration as a regular module so repeat imports reuse sys.modules and its .pyc
+_AGENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if _AGENT_DIR not in sys.path:
+    sys.path.insert(0, _AGENT_DIR)
+import config_AGENT as l_env
+import question_patterns
 
 # Setup logging
 log_dir = os.path.dirname(l_env.LOG_PATH)
 os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(l_env.LOG_PATH),
-        logging.StreamHandler()
-    ]
+# The event loop only enqueues records; a listener thread does the file and console I/O
+root_logger = logging.getLogger()
+if not root_logger.handlers:
+    log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    log_handlers = [logging.FileHandler(l_env.LOG_PATH), logging.StreamHandler()]
+    for log_handler in log_handlers:
+        log_handler.setFormatter(log_formatter)
+    log_queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
+
+# Default timeout for clicks and locator actions (ms). Real synchronization
+# points (navigation, dashboard render, panel open) pass their own timeouts.
+ACTION_TIMEOUT = 10000
+
+# How long discovered filters stay valid for a freshly loaded dashboard (seconds)
+FILTERS_CACHE_TTL = 600
+# How long a filtered dashboard capture is reused for equivalent questions (seconds)
+RESULT_CACHE_TTL = 300
+# How many interactive answers main() keeps for repeated questions
+RESPONSE_CACHE_SIZE = 128
+
+_FILTER_NOISE_RE = re.compile(r'\(all\)|\binclusive\b|\bfilter\b')
+
+# Filter-name keywords for the rule-based parser; one search per filter name
+_DEGREE_FILTER_RE = re.compile(r'award|level|degree')
+_LOCATION_FILTER_RE = re.compile(r'college|university|location|campus')
+_CATEGORY_FILTER_RE = re.compile(r'category|type|field')
+_PROGRAM_FILTER_RE = re.compile(r'program|subject|major')
+
+# Entity extraction patterns, compiled once at import
+_COLLEGE_NAMES = {
+    'lehman': 'Lehman',
+    'baruch': 'Baruch',
+    'queens': 'Queens',
+    'brooklyn': 'Brooklyn',
+    'hunter': 'Hunter',
+    'city college': 'City College',
+    'bronx': 'Bronx',
+    'staten island': 'Staten Island'
+}
+# When several colleges are named, the earlier-listed one wins
+_COLLEGE_ORDER = {college: i for i, college in enumerate(_COLLEGE_NAMES)}
+_WORD_RE = re.compile(r"[a-z]+")
+_ENROLLED_RE = re.compile(r'enrolled.*?(?:at|in)\s+([a-z\s]+(?:college|university))')
+_CIP_RES = (
+    (re.compile(r'\b(\d{2})\b'), 'cip_2digit'),
+    (re.compile(r'\b(\d{4})\b'), 'cip_4digit'),
+    (re.compile(r'\b(\d{6})\b'), 'cip_6digit')
+)
+
+# Substring keywords per entity type: value -> keywords, with earlier values winning
+_KEYWORD_GROUPS = (
+    ('degree', {
+        'bachelor': ['bachelor', 'bachelors', 'bachelor\'s'],
+        'master': ['master', 'masters', 'master\'s'],
+        'associate': ['associate'],
+        'certificate': ['certificate'],
+        'doctoral': ['doctoral', 'phd', 'doctorate']
+    }),
+    # STEM, Business, etc.
+    ('category', {
+        'stem': ['stem'],
+        'business': ['business', 'commerce'],
+        'engineering': ['engineering'],
+        'arts': ['arts', 'art'],
+        'science': ['science', 'scientific'],
+        'education': ['education', 'teaching'],
+        'medicine': ['medicine', 'medical'],
+        'law': ['law', 'legal'],
+        'technology': ['technology', 'tech']
+    }),
+    # Specific academic fields
+    ('stem_category', {
+        'computer science': ['computer science', 'cs', 'computing'],
+        'biology': ['biology', 'biological'],
+        'chemistry': ['chemistry', 'chemical'],
+        'engineering': ['engineering', 'engineer'],
+        'mathematics': ['mathematics', 'math', 'mathematical'],
+        'physics': ['physics', 'physical'],
+        'statistics': ['statistics', 'statistical'],
+        'technology': ['technology', 'tech'],
+        'earth science': ['earth science', 'environmental', 'marine science'],
+        'general science': ['general science', 'science']
+    }),
+    # Specific program names like "Business Administration", "Nursing", etc.
+    ('program', {program: [program] for program in
+                 ['business administration', 'nursing', 'psychology', 'education', 'social work', 'criminal justice']}),
+    ('award_name', {award: [award] for award in
+                    ['bachelor of arts', 'bachelor of science', 'master of arts', 'master of science', 'associate of arts', 'associate of science']}),
+    ('delivery_format', {
+        'online': ['online', 'distance', 'remote'],
+        'hybrid': ['hybrid', 'blended'],
+        'in-person': ['in-person', 'on-campus', 'campus', 'face-to-face']
+    }),
+    ('college_type', {
+        'community': ['community college', 'cc'],
+        'senior': ['senior college', 'four-year'],
+        'graduate': ['graduate school', 'graduate center']
+    }),
+    ('academic_plan', {plan: [plan] for plan in ['full-time', 'part-time', 'accelerated', 'evening', 'weekend']}),
+    ('sevis_eligible', {'Yes': ['sevis', 'international', 'f-1', 'visa']}),
+    ('education_credentials', {
+        'teacher credentials': ['teacher credentials', 'teaching credentials'],
+        'administration credentials': ['administration credentials', 'admin credentials'],
+        'counseling credentials': ['counseling credentials', 'pps credentials'],
+        'teacher aide': ['teacher aide', 'aide credentials']
+    })
+)
+
+# Award Level filter values for each degree keyword group
+_DEGREE_DISPLAY = {
+    'bachelor': "Bachelor's",
+    'master': "Master's",
+    'associate': 'Associate',
+    'certificate': 'Certificate',
+    'doctoral': 'Doctoral'
+}
+
+# What may follow a keyword for it to still count as a whole word ("sciences", "master's")
+_WORD_END = r"(?:'s|s)?(?!\w)"
+
+def _build_keyword_matcher(groups):
+    """Compile every group's keywords into one whole-word scan and map each hit to the (type, priority, value) claims it makes"""
+    claims = {}
+    for entity_type, patterns in groups:
+        for priority, (value, keywords) in enumerate(patterns.items()):
+            for keyword in keywords:
+                claims.setdefault(keyword, []).append((entity_type, priority, value))
+    # Keywords matching at the same position are all word prefixes of the longest one,
+    # which the longest-first alternation reports; so a hit also carries their claims
+    word_end = re.compile(_WORD_END)
+    hits = {keyword: tuple(claim for other in claims
+                           if keyword.startswith(other) and word_end.match(keyword, len(other))
+                           for claim in claims[other])
+            for keyword in claims}
+    alternation = '|'.join(map(re.escape, sorted(claims, key=len, reverse=True)))
+    return re.compile(r'(?=\b(%s)%s)' % (alternation, _WORD_END)), hits
+
+_KEYWORD_RE, _KEYWORD_HITS = _build_keyword_matcher(_KEYWORD_GROUPS)
+
+# Apply button selectors - based on actual HTML structure
+_APPLY_SELECTORS = (
+    'div.CFApplyButtonContainer button.apply',  # Most specific - exact structure
+    'button.tab-button.apply',                  # Button with apply class
+    'button[title="Apply"]',                    # Button with title attribute
+    'button:has-text("Apply")',                 # Button containing Apply text
+    'span.label:has-text("Apply")',             # Span with label class
+    'button[class*="apply"]',                   # Any button with apply in class
+)
+
+# All Apply selectors as one selector list, so a scope is searched in a single query
+_APPLY_SELECTOR = ", ".join(_APPLY_SELECTORS)
+
+# Polled by wait_for_function with [value, token]: each poll advances one checkbox step
+# (deselect "(All)", then select the value) once Tableau's aria state shows the previous one
+# landed, and resolves to 'ready' when only Apply is left. Tableau can ignore synthetic clicks,
+# so a step whose click has not shown up after 750 ms resolves to 'stuck' for a real click.
+_PANEL_SELECT_JS = """
+([value, token]) => {
+    const panel = document.querySelector('div[role="listbox"][class*="tile"]');
+    if (!panel) return false;
+    if (!window.__panelSelect || window.__panelSelect.token !== token) {
+        window.__panelSelect = {token, clickedAt: {}};
+    }
+    const clickedAt = window.__panelSelect.clickedAt;
+    const option = (title) => Array.from(panel.querySelectorAll('div[role="checkbox"]')).find(
+        (box) => Array.from(box.querySelectorAll('a[title]')).some((a) => a.getAttribute('title') === title));
+    const clickOnce = (step, box) => {
+        if (!(step in clickedAt)) {
+            clickedAt[step] = performance.now();
+            (box.querySelector('input') || box).click();
+        } else if (performance.now() - clickedAt[step] > 750) {
+            return 'stuck';
+        }
+        return false;
+    };
+    const all = option('(All)');
+    if (all && all.getAttribute('aria-checked') === 'true') return clickOnce('all', all);
+    const target = option(value);
+    if (!target) return false;
+    if (target.getAttribute('aria-checked') !== 'true') return clickOnce('value', target);
+    return 'ready';
+}
+"""
+
+# Analytics hosts that do not affect the filtered dashboard, blocked by Chromium's resolver:
+# Playwright routing would turn off the HTTP cache the persistent profiles keep warm.
+# Images are kept: the screenshot sent to the VLM can contain server-rendered viz tiles.
+_BLOCKED_HOSTS = ("google-analytics.com", "googletagmanager.com", "segment.io", "segment.com",
+                  "newrelic.com", "nr-data.net", "splunkcloud.com")
+_BLOCKED_HOSTS_ARG = "--host-resolver-rules=" + ", ".join(
+    f"MAP {host} ~NOTFOUND, MAP *.{host} ~NOTFOUND" for host in _BLOCKED_HOSTS
+)
+
+# Locator fallbacks for apply_dynamic_filter, in the order they are tried
+_FILTER_LOCATORS = (
+    'div[class*="tabComboBox"]:has-text("{}")',
+    'select[title*="{}"]',
+    'div[role="button"]:has-text("{}")',
+)
+_OPTION_LOCATORS = (
+    'div:has-text("{}")',
+    'li:has-text("{}")',
 )
 
+# Resolves a whole locator fallback chain in one round-trip. Each entry is
+# [css, text, attribute]: text mirrors Playwright's :has-text (case-insensitive,
+# whitespace-normalized substring), attribute a case-sensitive [attr*=text].
+# Returns the index of the first entry with a match and that element's tag name.
+_FIRST_MATCH_JS = """
+(candidates) => {
+    const normalize = (value) => value.replace(/\\s+/g, ' ').trim().toLowerCase();
+    for (let i = 0; i < candidates.length; i++) {
+        const [css, text, attribute] = candidates[i];
+        const needle = attribute ? text : normalize(text);
+        for (const el of document.querySelectorAll(css)) {
+            const haystack = attribute ? (el.getAttribute(attribute) || '') : normalize(el.textContent || '');
+            if (haystack.includes(needle)) {
+                return {index: i, tagName: el.tagName};
+            }
+        }
+    }
+    return null;
+}
+"""
+
+# Tags each filter's dropdown arrow with data-pwid="flt_<i>" and returns [{title, id}] for
+# every h3.FilterTitle; id is null when no arrow follows the title's container.
+_FILTER_MAP_JS = """
+() => {
+    const filters = [];
+    document.querySelectorAll('h3.FilterTitle').forEach((title, i) => {
+        let arrow = null;
+        // Same shape as div[class*="Title"]:has(h3.FilterTitle) ~ div span.tabComboBoxButton
+        for (let box = title.closest('div[class*="Title"]'); box && !arrow;
+             box = box.parentElement && box.parentElement.closest('div[class*="Title"]')) {
+            for (let sibling = box.nextElementSibling; sibling && !arrow; sibling = sibling.nextElementSibling) {
+                if (sibling.tagName === 'DIV') arrow = sibling.querySelector('span.tabComboBoxButton');
+            }
+        }
+        if (arrow) arrow.setAttribute('data-pwid', 'flt_' + i);
+        filters.push({title: title.textContent, id: arrow ? 'flt_' + i : null});
+    });
+    return filters;
+}
+"""
+
+# Tableau's own loading overlays, hidden once a query has rendered. Broader class matches
+# can hit elements that never hide and turn every wait into its full timeout
+_LOADING_SELECTOR = '.tab-loading-indicator, .tab-glass'
+
+# Marks window.__tableauIdle once the DOM has gone 300 ms without a mutation;
+# window.__markTableauBusy() restarts the quiet period after an action.
+_DOM_IDLE_TRACKER_JS = """
+() => {
+    if (window.__tableauIdleObserver) return;
+    let timer;
+    window.__markTableauBusy = () => {
+        window.__tableauIdle = false;
+        clearTimeout(timer);
+        timer = setTimeout(() => { window.__tableauIdle = true; }, 300);
+    };
+    window.__tableauIdleObserver = new MutationObserver(window.__markTableauBusy);
+    window.__tableauIdleObserver.observe(document.body, {subtree: true, childList: true, attributes: true});
+    window.__markTableauBusy();
+}
+"""
+
+def _match_keywords(text):
+    """Scan text once and return, per entity type, the highest-priority value with a keyword in it as a whole word"""
+    best = {}
+    for match in _KEYWORD_RE.finditer(text):
+        for entity_type, priority, value in _KEYWORD_HITS[match.group(1)]:
+            if entity_type not in best or priority < best[entity_type][0]:
+                best[entity_type] = (priority, value)
+    return {entity_type: value for entity_type, (priority, value) in best.items()}
+
+@lru_cache(maxsize=256)
+def _canonical_filter_name(name):
+    """Normalize a filter label so lookups ignore case, whitespace and Tableau noise words"""
+    return " ".join(_FILTER_NOISE_RE.sub(" ", name.lower()).split())
+
+
+def _try_lock(lock_file):
+    """Lock an open file exclusively without waiting; False if another handle holds the lock"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+class BrowserPool:
+    """Keeps warm Chromium browser contexts so each question does not pay browser start-up"""
+
+    def __init__(self, size=1):
+        self.size = max(1, size)
+        self._playwright = None
+        # Playwright objects are bound to the loop that created them, so the pool runs all of
+        # its browser work on one loop of its own, which outlives the callers' loops
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self._idle = None
+        # Browsers that may still be launched before the pool is full
+        self._available = 0
+        # context -> lock file of its profile, for every launched context
+        self._profiles = {}
+        self._closed = set()
+
+    def _owner_loop(self):
+        """Return the pool's event loop, starting its thread on first use"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="browser-pool", daemon=True).start()
+            return self._loop
+
+    async def run(self, coro):
+        """Await coro on the pool's event loop; browser work has to run there"""
+        loop = self._owner_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    async def _ensure_started(self):
+        """Start Playwright on the pool's loop if it is not running yet"""
+        if self._playwright is not None:
+            return
+        self._playwright = await async_playwright().start()
+        self._idle = asyncio.Queue()
+        self._available = self.size
+        self._profiles = {}
+        self._closed = set()
+
+    @staticmethod
+    def _claim_profile():
+        """
+        Lock the first free profile under PW_PROFILE_DIR and return its path and lock file.
+        Chromium can only open a profile in one browser, so other browsers and processes
+        skip profiles whose lock is held; the lock is released when its file is closed.
+        """
+        os.makedirs(l_env.PW_PROFILE_DIR, exist_ok=True)
+        index = 0
+        while True:
+            path = os.path.join(l_env.PW_PROFILE_DIR, f"browser-{index}")
+            lock_file = open(path + ".lock", "w")
+            if _try_lock(lock_file):
+                return path, lock_file
+            lock_file.close()
+            index += 1
+
+    async def _launch(self):
+        """Launch a browser on a persistent profile, whose context is reused for every page"""
+        path, lock_file = self._claim_profile()
+        try:
+            context = await self._playwright.chromium.launch_persistent_context(
+                path,
+                headless=l_env.HEADLESS,
+                viewport={"width": 1920, "height": 1080},
+                args=["--disable-dev-shm-usage", "--no-sandbox", "--disable-gpu", _BLOCKED_HOSTS_ARG]
+            )
+        except Exception:
+            lock_file.close()
+            raise
+        # Persistent contexts have no Browser object, so track disconnects through the context
+        context.on("close", lambda _: self._closed.add(context))
+        self._profiles[context] = lock_file
+        return context
+
+    def _discard(self, context):
+        """Forget a closed context and free its profile for a replacement browser"""
+        self._closed.discard(context)
+        self._profiles.pop(context).close()
+        self._available += 1
+
+    async def acquire(self):
+        """Return a connected browser context, launching a new one while the pool has capacity.
+            Runs on the pool's loop, like every use of the context it returns.
+        """
+        await self._ensure_started()
+        while True:
+            if self._idle.empty() and self._available:
+                self._available -= 1
+                try:
+                    return await self._launch()
+                except Exception:
+                    self._available += 1
+                    raise
+            context = await self._idle.get()
+            if context not in self._closed:
+                return context
+            # Drop crashed browsers so a replacement can be launched
+            self._discard(context)
+
+    async def release(self, context):
+        """Return a context to the pool, discarding it if its browser has disconnected"""
+        if context not in self._profiles:
+            # The pool was closed (and the context with it) while the context was in use
+            return
+        if context not in self._closed:
+            self._idle.put_nowait(context)
+        else:
+            self._discard(context)
+
+    async def _close(self):
+        """Close every browser the pool launched and stop Playwright; the profiles are kept"""
+        for context, lock_file in list(self._profiles.items()):
+            if context not in self._closed:
+                try:
+                    await context.close()
+                except Exception as e:
+                    logging.warning("Failed to close browser context: %s", e)
+            lock_file.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._playwright = None
+        self._idle = None
+        self._available = 0
+        self._profiles = {}
+        self._closed = set()
+
+    async def aclose(self):
+        """Close the pool from any event loop; the next acquire starts it again"""
+        if self._loop is not None:
+            await self.run(self._close())
+
+    def shutdown(self):
+        """Close the pool from synchronous code, such as main() or the atexit handler"""
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), loop).result(timeout=30)
+        except Exception as e:
+            logging.warning("Failed to close browser pool: %s", e)
+
+
 class TableauDashboardAgent:
     def __init__(self):
         self.dashboard_url = l_env.TABLEAU_DASHBOARD_URL
+        # (dashboard_url, page_url) -> (discovered_at, filters, labels a refresh did not find)
+        self._filters_cache = {}
+        # Pages whose filters were changed, so their current values no longer match the cache
+        self._dirty_pages = weakref.WeakSet()
+        # (dashboard_url, sorted entities) -> (captured_at, result)
+        self._result_cache = {}
+        self._openai_client = None
 
-    async def discover_all_filters(self, page: Page):
-        """Discover all available filters using the correct, specific class name."""
+    async def discover_all_filters(self, page: Page, force_refresh=False):
+        """Discover all available filters using the correct, specific class name.
+            force_refresh re-reads the page (and re-caches it) even if a fresh entry exists.
+        """
         try:
+            cache_key = (self.dashboard_url, page.url)
+            use_cache = page not in self._dirty_pages
+            if use_cache and not force_refresh:
+                cached = self._filters_cache.get(cache_key)
+                if cached and time.monotonic() - cached[0] < FILTERS_CACHE_TTL:
+                    print(f"✅ Using {len(cached[1])} cached filters")
+                    return cached[1]
+        
             print("Discovering filters using selector 'div.tabComboBoxNameContainer'...")
         
             filters = await page.evaluate("""
                 () => {
                     const filters = [];
+                    const seenControls = new Set();
                     // 1. Find all the dropdown boxes using the class you identified.
                     const dropdownElements = document.querySelectorAll('div.tabComboBoxNameContainer');
                 
@@ -53,7 +575,13 @@ class TableauDashboardAgent:
                     // 2. The dropdown control is a few levels up and has the 'aria-labelledby' attribute.
                         const control = el.closest('[role="button"]');
                     
+                        // Report each control once, even if it holds several name containers
+                        if (control && seenControls.has(control)) {
+                            return;
+                        }
+                    
                         if (control) {
+                            seenControls.add(control);
                             // 3. Get the ID of the label from the 'aria-labelledby' attribute.
                             const labelId = control.getAttribute('aria-labelledby');
                             if (labelId) {
@@ -78,32 +606,48 @@ class TableauDashboardAgent:
             for filter_info in filters:
                 print(f"  - Label: {filter_info['label']}, Current Value: {filter_info['currentValue']}")
         
+            if use_cache:
+                self._filters_cache[cache_key] = (time.monotonic(), filters, set())
+        
             return filters
         
         except Exception as e:
             print(f"Error discovering filters: {e}")
             return []
         
-    
+    def clear_filter_cache(self):
+        """Forget discovered filters so the next discover_all_filters reads the page again"""
+        self._filters_cache.clear()
+
+    def _known_missing_filters(self, page):
+        """Canonical labels a refreshed discovery of the page did not find, while its entry is fresh"""
+        cached = self._filters_cache.get((self.dashboard_url, page.url))
+        if cached and time.monotonic() - cached[0] < FILTERS_CACHE_TTL:
+            return cached[2]
+        return set()
+
+    async def _discover_filter_map(self, page):
+        """Tag every filter's dropdown arrow in one evaluate; returns [(normalized title, arrow id)]"""
+        filters = await page.evaluate(_FILTER_MAP_JS)
+        return [(" ".join(f['title'].split()).lower(), f['id']) for f in filters]
+
 
     async def apply_dynamic_filter(self, page, filter_name, filter_value):
         """Apply any filter dynamically using Playwright's built-in waiting"""
         try:
             print(f"Applying filter '{filter_name}' with value '{filter_value}'...")
+            self._dirty_pages.add(page)
             
-            # Try to find the filter element with built-in waiting
-            filter_locator = page.locator(f'div[class*="tabComboBox"]:has-text("{filter_name}")')
-            
-            if await filter_locator.count() == 0:
-                filter_locator = page.locator(f'select[title*="{filter_name}"]')
-            
-            if await filter_locator.count() == 0:
-                filter_locator = page.locator(f'div[role="button"]:has-text("{filter_name}")')
-            
-            if await filter_locator.count() > 0:
+            # Probe every fallback locator (and read the tag name) in one round-trip
+            match = await page.evaluate(_FIRST_MATCH_JS, [
+                ['div[class*="tabComboBox"]', filter_name, None],
+                ['select', filter_name, 'title'],
+                ['div[role="button"]', filter_name, None]
+            ])
+            if match:
+                filter_locator = page.locator(_FILTER_LOCATORS[match['index']].format(filter_name))
                 # Check if it's a select element
-                tag_name = await filter_locator.first.evaluate("el => el.tagName")
-                if tag_name.lower() == 'select':
+                if match['tagName'].lower() == 'select':
                     await filter_locator.first.select_option(label=filter_value)
                     print(f"Applied {filter_name} filter: {filter_value}")
                     return True
@@ -113,14 +657,17 @@ class TableauDashboardAgent:
                     await filter_locator.first.click()
                     
                     # Wait for dropdown to appear and click option
-                    option_locator = page.locator(f'div:has-text("{filter_value}")')
-                    if await option_locator.count() == 0:
-                        option_locator = page.locator(f'li:has-text("{filter_value}")')
-                    
-                    if await option_locator.count() > 0:
-                        await option_locator.first.click()
+                    option = await page.evaluate(_FIRST_MATCH_JS, [
+                        ['div', filter_value, None],
+                        ['li', filter_value, None]
+                    ])
+                    if option:
+                        await page.locator(_OPTION_LOCATORS[option['index']].format(filter_value)).first.click()
                         print(f"Applied {filter_name} filter: {filter_value}")
                         return True
+                    
+                    # Close the dropdown we opened so it doesn't block later filters
+                    await page.keyboard.press('Escape')
             
             print(f"Could not find or apply filter: {filter_name}")
             return False
@@ -167,50 +714,46 @@ class TableauDashboardAgent:
 
     def parse_question_fallback(self, question, available_filters):
         """Fallback rule-based parsing when LLM is not available"""
+        matches = self._match_filters(question.lower(), tuple(f['text'] for f in available_filters))
+        return {"filters_to_apply": [{"filter_name": name, "filter_value": value} for name, value in matches]}
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _match_filters(question_lower, filter_names):
+        """Return (filter_name, filter_value) pairs for the filters the question's entities select"""
         filters_to_apply = []
-        question_lower = question.lower()
         
         # Extract entities from the question
-        entities = self.extract_entities_from_question(question_lower)
+        entities = dict(TableauDashboardAgent._extract_entities_cached(question_lower))
         
         # Match entities with available filters
-        for filter_info in available_filters:
-            filter_name = filter_info['text'].lower()
+        for name in filter_names:
+            filter_name = _canonical_filter_name(name)
             
             # Check for degree level matches
-            if any(word in filter_name for word in ['award', 'level', 'degree']) and entities.get('degree'):
-                filters_to_apply.append({
-                    "filter_name": filter_info['text'],
-                    "filter_value": entities['degree']
-                })
+            if _DEGREE_FILTER_RE.search(filter_name) and entities.get('degree'):
+                filters_to_apply.append((name, entities['degree']))
             
             # Check for location matches
-            elif any(word in filter_name for word in ['college', 'university', 'location', 'campus']) and entities.get('location'):
-                filters_to_apply.append({
-                    "filter_name": filter_info['text'],
-                    "filter_value": entities['location']
-                })
+            elif _LOCATION_FILTER_RE.search(filter_name) and entities.get('location'):
+                filters_to_apply.append((name, entities['location']))
             
             # Check for category matches
-            elif any(word in filter_name for word in ['category', 'type', 'field']) and entities.get('category'):
-                filters_to_apply.append({
-                    "filter_name": filter_info['text'],
-                    "filter_value": entities['category']
-                })
+            elif _CATEGORY_FILTER_RE.search(filter_name) and entities.get('category'):
+                filters_to_apply.append((name, entities['category']))
             
             # Check for program matches
-            elif any(word in filter_name for word in ['program', 'subject', 'major']) and entities.get('program'):
-                filters_to_apply.append({
-                    "filter_name": filter_info['text'],
-                    "filter_value": entities['program']
-                })
+            elif _PROGRAM_FILTER_RE.search(filter_name) and entities.get('program'):
+                filters_to_apply.append((name, entities['program']))
         
-        return {"filters_to_apply": filters_to_apply}
+        return tuple(filters_to_apply)
 
-    async def apply_filters_based_on_question(self, page, question):
+    async def apply_filters_based_on_question(self, page, question, discovered_filters=None):
         """
             Finds a filter, deselects "(All)", selects the correct value, 
             and clicks the "Apply" button inside the dropdown.
+            Filters whose discovered current value already matches are not opened.
+            Returns True when every requested filter is in place.
         """
         try:
             # Simple NLU to get filter values from the question
@@ -266,93 +809,82 @@ class TableauDashboardAgent:
             print(f"Filters to apply: {filters_to_apply}")
             if not filters_to_apply:
                 print("No filters found in question!")
-                return
+                return True
+
+            current_values = {_canonical_filter_name(f['label']): f['currentValue'] for f in discovered_filters or []}
+            missing = {_canonical_filter_name(label) for label in filters_to_apply} - current_values.keys()
+            # A discovery without a requested filter may be a stale cache entry; re-read it
+            # while the page still shows its unfiltered values, so the refresh is cached.
+            # Labels the refresh does not find either are remembered with the new entry, so
+            # questions asking for them do not refresh again until it expires
+            if discovered_filters and missing - self._known_missing_filters(page):
+                print("  -> Discovered filters lack a requested filter, refreshing discovery...")
+                discovered_filters = await self.discover_all_filters(page, force_refresh=True)
+                current_values = {_canonical_filter_name(f['label']): f['currentValue'] for f in discovered_filters}
+                if discovered_filters:
+                    self._known_missing_filters(page).update(missing - current_values.keys())
+
+            # Filter values on this page will no longer match the cached discovery
+            self._dirty_pages.add(page)
+            # Arrow tags are re-read after each dashboard reload, since Tableau may re-render the filters
+            filter_map = None
+            all_applied = True
 
             for label, value_to_select in filters_to_apply.items():
                 print(f"\n=== Applying Filter: {label} = {value_to_select} ===")
                 
-                # 1. Find the filter's title element - handle strict mode violations
-                label_locator = page.locator(f'h3.FilterTitle:has-text("{label}")')
-                count = await label_locator.count()
+                # Skip opening the dropdown when the filter already shows the value
+                if current_values.get(_canonical_filter_name(label)) == value_to_select:
+                    print(f"  -> '{label}' is already set to '{value_to_select}', skipping.")
+                    continue
                 
-                if count == 0:
+                # 1. Find the filter's title element (matched like :has-text) - handle strict mode violations
+                if filter_map is None:
+                    filter_map = await self._discover_filter_map(page)
+                needle = " ".join(label.split()).lower()
+                matches = [arrow_id for title, arrow_id in filter_map if needle in title]
+                
+                if not matches:
                     print(f"  -> Could not find filter with label '{label}'.")
+                    # The dashboard's filters changed; don't keep serving the old discovery,
+                    # unless a refreshed discovery already found the filter missing
+                    if _canonical_filter_name(label) not in self._known_missing_filters(page):
+                        self.clear_filter_cache()
                     return False
-                elif count > 1:
-                    print(f"  -> Found {count} filters with label '{label}', using first one")
-                    label_locator = label_locator.first
+                elif len(matches) > 1:
+                    print(f"  -> Found {len(matches)} filters with label '{label}', using first one")
             
-                # 2. Find and click the dropdown arrow
-                arrow_locator = label_locator.locator('xpath=./ancestor::div[contains(@class, "Title")]/following-sibling::div//span[@class="tabComboBoxButton"]')
-                await arrow_locator.click()
+                # 2. Click the dropdown arrow tagged during discovery
+                arrow_id = next((arrow_id for arrow_id in matches if arrow_id), None)
+                if arrow_id is None:
+                    print(f"  -> Could not find the dropdown arrow for '{label}'.")
+                    all_applied = False
+                    continue
+                await page.locator(f'[data-pwid="{arrow_id}"]').click()
 
                 # 3. Wait for the filter options panel to become visible
                 panel_locator = page.locator('div[role="listbox"][class*="tile"]')
                 await panel_locator.wait_for(state="visible", timeout=10000)
                 print("  -> Filter panel is open.")
             
-                # 4. Deselect the "(All)" option
-                all_checkbox = panel_locator.locator('div[role="checkbox"]:has(a[title="(All)"]) input')
-                await all_checkbox.click()
-                print("  -> Deselected '(All)'.")
-            
-                # --- Add a brief pause to allow the web page's JavaScript to react ---
-                await page.wait_for_timeout(500)
-
-                # 5. Select the desired value
-                value_checkbox = panel_locator.locator(f'div[role="checkbox"]:has(a[title="{value_to_select}"]) input')
-                await value_checkbox.click()
-                print(f"  -> Selected '{value_to_select}'.")
-            
-                # --- Add another pause before looking for the Apply button ---
-                await page.wait_for_timeout(500)
-                
-                # Try multiple selectors for the Apply button - based on actual HTML structure
-                apply_button = None
-                apply_selectors = [
-                    'div.CFApplyButtonContainer button.apply',  # Most specific - exact structure
-                    'button.tab-button.apply',                  # Button with apply class
-                    'button[title="Apply"]',                    # Button with title attribute
-                    'button:has-text("Apply")',                 # Button containing Apply text
-                    'span.label:has-text("Apply")',             # Span with label class
-                    'button[class*="apply"]'                     # Any button with apply in class
-                ]
-                
-                print("  -> Looking for Apply button...")
-                
-                # Try to find Apply button - first in panel, then page level
-                for selector in apply_selectors:
-                    try:
-                        # Try within the panel first
-                        apply_button = panel_locator.locator(selector)
-                        count = await apply_button.count()
-                        if count > 0:
-                            print(f"  -> Found Apply button in panel with selector: {selector}")
-                            break
-                        
-                        # If not found in panel, try at page level
-                        apply_button = page.locator(selector)
-                        count = await apply_button.count()
-                        if count > 0:
-                            print(f"  -> Found Apply button on page with selector: {selector}")
-                            break
-                    except:
-                        continue
+                # 4-5. Deselect "(All)" and select the value in one polled in-page routine
+                try:
+                    state = await page.wait_for_function(
+                        _PANEL_SELECT_JS, arg=[value_to_select, time.monotonic_ns()], timeout=5000
+                    )
+                    state = await state.json_value()
+                except Exception as e:
+                    state = f"timed out: {e}"
                 
-                if apply_button and await apply_button.count() > 0:
-                    # Try to click the Apply button
-                    try:
-                        await apply_button.click()
-                        print("  -> Clicked 'Apply' in dropdown.")
-                    except Exception as e:
-                        print(f"  -> Regular click failed: {e}, trying dispatch_event")
-                        try:
-                            await apply_button.dispatch_event('click')
-                            print("  -> Clicked 'Apply' with dispatch_event.")
-                        except Exception as e2:
-                            print(f"  -> Both click methods failed: {e2}")
+                # 6. Click Apply with real input; redo the checkbox steps the same way if they did not take
+                if state == 'ready':
+                    print(f"  -> Deselected '(All)' and selected '{value_to_select}'.")
+                    applied = await self.click_panel_apply(page, panel_locator)
                 else:
-                    print("  -> ERROR: Could not find Apply button with any selector")
+                    print(f"  -> In-page selection did not take ({state}), using Playwright clicks")
+                    applied = await self.select_in_panel(page, panel_locator, value_to_select)
+                if not applied:
+                    all_applied = False
                 
                 # 7. Wait for the panel to disappear (with fallback)
                 try:
@@ -363,20 +895,92 @@ class TableauDashboardAgent:
                     print("  -> Proceeding anyway...")
                     print("  -> Trying to close panel manually...")
                     await page.keyboard.press('Escape')
-                    await page.wait_for_timeout(1000)
+                    try:
+                        await panel_locator.wait_for(state="hidden", timeout=1000)
+                    except Exception:
+                        print("  -> Panel still visible after Escape, continuing...")
                 
                 # 8. Wait for dashboard to reload before applying next filter
                 print("  -> Waiting for dashboard to reload...")
                 await self.wait_for_dashboard_reload(page)
+                filter_map = None
                 print("  -> Dashboard reload completed.")
+
+            return all_applied
     
         except Exception as e:
             print(f"Error applying filters: {e}")
             print("Continuing with next steps...")
+            return False
+
+
 
 
 
+    async def select_in_panel(self, page, panel_locator, value_to_select):
+        """Deselect "(All)", select the value and click Apply with Playwright clicks, skipping steps already done.
+            Returns True once Apply was clicked.
+        """
+        # 4. Deselect the "(All)" option
+        all_option = panel_locator.locator('div[role="checkbox"]:has(a[title="(All)"])').first
+        if await all_option.get_attribute('aria-checked') != 'false':
+            await all_option.locator('input').click()
+            print("  -> Deselected '(All)'.")
+        
+            # --- Wait for Tableau to register the deselect before the next click ---
+            try:
+                await page.wait_for_function(
+                    "el => el.getAttribute('aria-checked') !== 'true'",
+                    arg=await all_option.element_handle(), timeout=2000
+                )
+            except Exception:
+                # The checkbox was re-rendered or lacks aria state; fall back to DOM quiet
+                await self.wait_for_dom_idle(page)
+
+        # 5. Select the desired value
+        value_option = panel_locator.locator(f'div[role="checkbox"]:has(a[title="{value_to_select}"])').first
+        if await value_option.get_attribute('aria-checked') != 'true':
+            await value_option.locator('input').click()
+            print(f"  -> Selected '{value_to_select}'.")
+        
+        # No settle wait here: the Apply button is rendered with the panel, and
+        # click() already waits for it to be visible, stable and enabled
+        return await self.click_panel_apply(page, panel_locator)
 
+    async def click_panel_apply(self, page, panel_locator):
+        """Click the open filter panel's Apply button; returns True once it was clicked"""
+        # Try multiple selectors for the Apply button - based on actual HTML structure
+        apply_button = None
+        print("  -> Looking for Apply button...")
+        
+        # Try to find Apply button - first in panel, then page level, one query per scope
+        for scope, where in ((panel_locator, "panel"), (page, "page")):
+            candidates = scope.locator(_APPLY_SELECTOR)
+            try:
+                if await candidates.count() > 0:
+                    apply_button = candidates.first
+                    print(f"  -> Found Apply button in {where}")
+                    break
+            except Exception:
+                continue
+        
+        if apply_button is not None:
+            # Try to click the Apply button
+            try:
+                await apply_button.click()
+                print("  -> Clicked 'Apply' in dropdown.")
+                return True
+            except Exception as e:
+                print(f"  -> Regular click failed: {e}, trying dispatch_event")
+                try:
+                    await apply_button.dispatch_event('click')
+                    print("  -> Clicked 'Apply' with dispatch_event.")
+                    return True
+                except Exception as e2:
+                    print(f"  -> Both click methods failed: {e2}")
+        else:
+            print("  -> ERROR: Could not find Apply button with any selector")
+        return False
 
     async def click_apply_button(self, page):
         """Finds and clicks the Apply button."""
@@ -387,6 +991,7 @@ class TableauDashboardAgent:
 
             if await apply_button_locator.count() > 0:
                 await apply_button_locator.click()
+                self._dirty_pages.add(page)
                 print("✅ 'Apply' button clicked.")
                 return True
             else:
@@ -397,6 +1002,14 @@ class TableauDashboardAgent:
             print(f"Error clicking apply button: {e}")
             return False
 
+    async def wait_for_dom_idle(self, page, timeout=2000):
+        """Waits until the page has had no DOM mutations for 300 ms."""
+        try:
+            await page.evaluate("() => window.__markTableauBusy && window.__markTableauBusy()")
+            await page.wait_for_function("() => window.__tableauIdle !== false", timeout=timeout)
+        except Exception as e:
+            print(f"  -> DOM did not settle within {timeout} ms, continuing: {e}")
+
     async def wait_for_dashboard_reload(self, page):
         """
         Waits for the dashboard to reload using a more reliable and resilient strategy.
@@ -404,10 +1017,12 @@ class TableauDashboardAgent:
         try:
             print("Waiting for dashboard to reload...")
         
-            # Use 'load' instead of 'networkidle'. This is more reliable for complex apps
-            # like Tableau that may have continuous background network activity.
-            # It waits for the page's main load event to fire.
-            await page.wait_for_load_state('load', timeout=30000)
+            # Tableau re-renders in place after a filter change, so the page's 'load' event
+            # fired long ago and waiting on it returns immediately. Wait for the loading
+            # overlay to clear, the filters to be back, and the viz to stop mutating instead.
+            await page.wait_for_selector(_LOADING_SELECTOR, state='hidden', timeout=30000)
+            await page.wait_for_selector('div.tabComboBoxNameContainer', timeout=30000)
+            await self.wait_for_dom_idle(page, timeout=10000)
         
             print("Dashboard reload wait completed.")
         
@@ -418,33 +1033,37 @@ class TableauDashboardAgent:
             print(f"Warning: A timeout occurred during the reload wait, but the agent will proceed. Error: {e}")
     
     async def capture_dashboard_screenshot(self, page, question):
-        """Capture full-page screenshot after filters are applied for VLM analysis"""
+        """Capture the dashboard's screenshot after filters are applied for VLM analysis"""
         try:
-            # Wait for dashboard to fully load after filters
+            # Wait for dashboard to fully load after filters: no loading overlay, no DOM churn
             print("📸 Waiting for dashboard to stabilize before screenshot...")
-            await page.wait_for_timeout(5000)
+            try:
+                await page.wait_for_selector(_LOADING_SELECTOR, state='hidden', timeout=10000)
+            except Exception as e:
+                print(f"Loading indicator still visible, capturing anyway: {e}")
+            await self.wait_for_dom_idle(page, timeout=10000)
             
             # Ensure screenshots directory exists
             os.makedirs("screenshots", exist_ok=True)
             
-            # Generate unique filename with timestamp
+            # Generate unique filename with timestamp; pooled browsers can capture within the same second
             timestamp = int(time.time())
-            screenshot_path = f"screenshots/dashboard_{timestamp}.png"
+            screenshot_path = f"screenshots/dashboard_{timestamp}_{uuid.uuid4().hex}.png"
             
-            # Take full page screenshot
+            # Clip to the dashboard container; the page around it is empty chrome
             print(f"📸 Capturing screenshot: {screenshot_path}")
-            await page.screenshot(path=screenshot_path, full_page=True)
-            
-            # Convert to base64 for VLM processing
-            with open(screenshot_path, "rb") as image_file:
-                image_base64 = base64.b64encode(image_file.read()).decode('utf-8')
+            container = page.locator('div#centeringContainer')
+            if await container.count() > 0:
+                await container.first.screenshot(path=screenshot_path, timeout=30000)
+            else:
+                await page.screenshot(path=screenshot_path, full_page=True, timeout=30000)
             
+            # Only the path is returned; analyze_dashboard_with_vlm encodes the file when it uploads it
             print(f"Screenshot captured successfully: {screenshot_path}")
-            print(f"Image size: {len(image_base64)} characters (base64)")
+            print(f"Image size: {os.path.getsize(screenshot_path)} bytes")
             
             return {
                 "screenshot_path": screenshot_path,
-                "image_base64": image_base64,
                 "timestamp": timestamp
             }
             
@@ -468,6 +1087,23 @@ class TableauDashboardAgent:
             print(f"Error setting up OCI Vision client: {e}")
             return None
 
+    def get_openai_client(self):
+        """Create the OpenAI client once and check the API key on first use"""
+        if self._openai_client is None:
+            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) # Replace with your actual key
+            # Test API key with a simple call
+            try:
+                client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[{"role": "user", "content": "Hello"}],
+                    max_tokens=10
+                )
+                print("✅ API key is working!")
+            except Exception as e:
+                print(f"❌ API key test failed: {e}")
+            self._openai_client = client
+        return self._openai_client
+
     async def analyze_dashboard_with_vlm(self, screenshot_data, question, applied_filters):
         """Use GPT-4 Vision to analyze dashboard screenshot and answer question directly"""
         try:
@@ -478,28 +1114,16 @@ class TableauDashboardAgent:
             if not screenshot_path:
                 return {"error": "No screenshot path available"}
         
-            import openai
-            import base64
-        
             # Encode image
             with open(screenshot_path, "rb") as image_file:
                 base64_image = base64.b64encode(image_file.read()).decode('utf-8')
         
-            # Set your API key
-            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) # Replace with your actual key
-            # Test API key with a simple call
-            try:
-                test_response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[{"role": "user", "content": "Hello"}],
-                    max_tokens=10
-                )
-                print("✅ API key is working!")
-            except Exception as e:
-                print(f"❌ API key test failed: {e}")
-      
+            client = self.get_openai_client()
 
-            response = client.chat.completions.create(
+            # The OpenAI client is synchronous; keep the event loop (and other pooled
+            # browsers) running while the request is in flight
+            response = await asyncio.to_thread(
+                client.chat.completions.create,
                 model="gpt-4o",
                 messages=[
                     {
@@ -540,20 +1164,34 @@ class TableauDashboardAgent:
 
 
     async def analyze_dashboard(self, question):
+        # The filters applied, and so the screenshot, depend only on the extracted entities;
+        # rephrasings of the same request reuse the capture instead of driving the browser again
+        cache_key = (self.dashboard_url, tuple(sorted(self.extract_entities_from_question(question.lower()).items())))
+        cached = self._result_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < RESULT_CACHE_TTL:
+            logging.info("Reusing dashboard capture for equivalent filters")
+            return dict(cached[1], question=question)
+        return await browser_pool.run(self._drive_dashboard(question, cache_key))
+
+    async def _drive_dashboard(self, question, cache_key):
+        """Load the dashboard in a pooled browser, apply the question's filters and capture it"""
+        context = None
+        page = None
         try:
             logging.info("Using Playwright to apply filters and extract data...")
         
-            playwright = await async_playwright().start()
-            browser = await playwright.chromium.launch(headless=False)
-            page = await browser.new_page(viewport={"width": 1920, "height": 1080})
-            page.set_default_timeout(60000)
+            context = await browser_pool.acquire()
+            page = await context.new_page()
+            page.set_default_timeout(ACTION_TIMEOUT)
         
             print(f"🌍 Navigating to: {self.dashboard_url}")
-            await page.goto(self.dashboard_url, wait_until="load", timeout=60000)
+            # Return at DOMContentLoaded; the selector waits below are the real readiness signal
+            await page.goto(self.dashboard_url, wait_until="domcontentloaded", timeout=60000)
             print("✅ Page loaded successfully")
             
-            print("⏸️ Pausing for 3 seconds so we can see the browser...")
-            await page.wait_for_timeout(3000)
+            if not l_env.HEADLESS:
+                print("⏸️ Pausing for 3 seconds so we can see the browser...")
+                await page.wait_for_timeout(3000)
     
             # 1. Wait for the main container to be ready.
             print("Waiting for Tableau container to be ready...")
@@ -565,10 +1203,13 @@ class TableauDashboardAgent:
             await page.wait_for_selector('div.tabComboBoxNameContainer', timeout=60000) # Increased timeout
             print("Filters have rendered.")
 
+            # Track DOM mutations so filter steps can wait for the page to settle
+            await page.evaluate(_DOM_IDLE_TRACKER_JS)
+
             # --- All actions now use the main 'page' object ---
         
-            await self.discover_all_filters(page)
-            await self.apply_filters_based_on_question(page, question)
+            filters = await self.discover_all_filters(page)
+            filters_applied = await self.apply_filters_based_on_question(page, question, filters)
             
             # Capture screenshot for VLM analysis
             screenshot_data = await self.capture_dashboard_screenshot(page, question)
@@ -581,27 +1222,40 @@ class TableauDashboardAgent:
             }
 
             # Adding a long pause so we can visually inspect the filtered dashboard.
-            print("Pausing for 5 seconds to observe the results...")
-            await page.wait_for_timeout(5000) # 5-second pause
-            
-            await browser.close()
-            await playwright.stop()
+            if not l_env.HEADLESS:
+                print("Pausing for 5 seconds to observe the results...")
+                await page.wait_for_timeout(5000) # 5-second pause
         
+            # A capture with missing filters is not the answer for these entities
+            if filters_applied and "error" not in screenshot_data:
+                self._result_cache[cache_key] = (time.monotonic(), result)
             return result
         
         except Exception as e:
-            logging.error(f"Failed to analyze dashboard: {e}")
+            logging.error("Failed to analyze dashboard: %s", e)
             return {"error": f"Dashboard analysis error: {str(e)[:200]}..."}
+        
+        finally:
+            # Close only the page; the browser context goes back to the pool for the next question
+            if page is not None:
+                try:
+                    await page.close()
+                except Exception as e:
+                    logging.warning("Failed to close page: %s", e)
+            if context is not None:
+                await browser_pool.release(context)
     
     async def analyze_dashboard_data(self, question, data):
         """Analyze the dashboard data and prepare for VLM processing"""
         try:
             # Handle truncated questions by expanding common patterns
-            expanded_question = self.expand_truncated_question(question)
-            logging.info(f"Original question: '{question}' -> Expanded: '{expanded_question}'")
+            question_lower = question.lower()
+            expanded_question = self.expand_truncated_question(question, question_lower)
+            logging.info("Original question: '%s' -> Expanded: '%s'", question, expanded_question)
             
             # Extract entities from expanded question
-            entities = self.extract_entities_from_question(expanded_question.lower())
+            expanded_lower = expanded_question.lower()
+            entities = self.extract_entities_from_question(expanded_lower)
             
             # Get screenshot data for VLM analysis
             screenshot_data = data.get("screenshot_data", {})
@@ -659,235 +1313,120 @@ class TableauDashboardAgent:
             return "\n\n".join(response_parts)
             
         except Exception as e:
-            logging.error(f"Failed to analyze dashboard data: {e}")
+            logging.error("Failed to analyze dashboard data: %s", e)
             return f"Analysis error: {str(e)}"
 
-    def expand_truncated_question(self, question):
+    @staticmethod
+    def expand_truncated_question(question, question_lower=None):
         """Expand truncated questions to their likely full form"""
-        question_lower = question.lower()
-        
-        # Common truncation patterns and their expansions
-        expansions = {
-            "show me data for bachelor": "show me data for bachelor's programs",
-            "show me data for master": "show me data for master's programs", 
-            "show me data for associate": "show me data for associate programs",
-            "show me data for certificate": "show me data for certificate programs",
-            "how many bachelor": "how many bachelor's programs",
-            "how many master": "how many master's programs",
-            "how many associate": "how many associate programs",
-            "how many certificate": "how many certificate programs",
-            "filter by college": "filter by college and show results",
-            "filter by degree": "filter by degree level and show results",
-            "filter by program": "filter by program type and show results",
-            "compare data": "compare data across different categories",
-            "show me trends": "show me trends in the data over time",
-            "show me charts": "show me charts and visualizations",
-            "show me graphs": "show me graphs and charts"
-        }
-        
-        # Check for exact matches first
-        for truncated, expanded in expansions.items():
-            if question_lower == truncated:
-                return expanded
-        
-        # Check for partial matches
-        for truncated, expanded in expansions.items():
-            if truncated in question_lower:
-                return expanded
-        
-        # If no match found, return original question
-        return question
+        return question_patterns.expand_truncated_question(question, question_lower)
 
     def extract_entities_from_question(self, question_lower):
         """Extract entities from question"""
+        # The same question is parsed for filtering and again for the answer; give each caller its own dict
+        return dict(self._extract_entities_cached(question_lower))
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _extract_entities_cached(question_lower):
+        """Entity extraction proper, memoized on the lowercased question"""
         entities = {}
-        import re
-        
-        # Extract location entities (colleges, universities, etc.)
-        college_names = ['lehman', 'baruch', 'queens', 'brooklyn', 'hunter', 'city college', 'bronx', 'staten island']
-        for college in college_names:
-            if college in question_lower:
-                if college == 'lehman':
-                    entities['location'] = 'Lehman'
-                elif college == 'city college':
-                    entities['location'] = 'City College'
-                else:
-                    entities['location'] = college.title()
-                break
+        
+        # Extract location entities (colleges, universities, etc.) by looking up
+        # the question's words and word pairs, so multi-word names still match
+        words = _WORD_RE.findall(question_lower)
+        terms = set(words)
+        terms.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        colleges = terms & _COLLEGE_NAMES.keys()
+        if colleges:
+            entities['location'] = _COLLEGE_NAMES[min(colleges, key=_COLLEGE_ORDER.__getitem__)]
         
         # If no specific college found, try regex patterns
         if 'location' not in entities:
-            location_patterns = [
-                r'\b([a-z]+(?:\s+[a-z]+)*)\s+(?:college|university|school|institution)\b',
-                r'\b([a-z]+(?:\s+[a-z]+)*)\s+(?:city|state|county)\b'
-            ]
-            
-            for pattern in location_patterns:
-                matches = re.findall(pattern, question_lower)
-                if matches:
-                    entities['location'] = matches[0].title()
-                    break
+            location = question_patterns.find_location(question_lower)
+            if location:
+                entities['location'] = location
         
-        # Extract degree level entities
-        degree_patterns = {
-            'bachelor': ['bachelor', 'bachelors', 'bachelor\'s'],
-            'master': ['master', 'masters', 'master\'s'],
-            'associate': ['associate'],
-            'certificate': ['certificate'],
-            'doctoral': ['doctoral', 'phd', 'doctorate']
-        }
+        # Every keyword group below is resolved by one scan of the question
+        keywords = _match_keywords(question_lower)
         
-        for degree_type, keywords in degree_patterns.items():
-            for keyword in keywords:
-                if keyword in question_lower:
-                    entities['degree'] = degree_type.title() + ("'s" if degree_type in ['bachelor', 'master'] else "")
-                    break
-            if 'degree' in entities:
-                break
+        # Extract degree level entities
+        degree_type = keywords.get('degree')
+        if degree_type:
+            entities['degree'] = _DEGREE_DISPLAY[degree_type]
         
         # Extract category entities (STEM, Business, etc.)
-        category_patterns = {
-            'stem': ['stem'],
-            'business': ['business', 'commerce'],
-            'engineering': ['engineering'],
-            'arts': ['arts', 'art'],
-            'science': ['science', 'scientific'],
-            'education': ['education', 'teaching'],
-            'medicine': ['medicine', 'medical'],
-            'law': ['law', 'legal'],
-            'technology': ['technology', 'tech']
-        }
-        
-        for category, keywords in category_patterns.items():
-            for keyword in keywords:
-                if keyword in question_lower:
-                    entities['category'] = category.title()
-                    break
-            if 'category' in entities:
-                break
-        
-                # Extract STEM category entities (specific academic fields)
-        stem_categories = {
-            'computer science': ['computer science', 'cs', 'computing'],
-            'biology': ['biology', 'biological'],
-            'chemistry': ['chemistry', 'chemical'],
-            'engineering': ['engineering', 'engineer'],
-            'mathematics': ['mathematics', 'math', 'mathematical'],
-            'physics': ['physics', 'physical'],
-            'statistics': ['statistics', 'statistical'],
-            'technology': ['technology', 'tech'],
-            'earth science': ['earth science', 'environmental', 'marine science'],
-            'general science': ['general science', 'science']
-        }
+        category = keywords.get('category')
+        if category:
+            entities['category'] = category.title()
         
-        for category, keywords in stem_categories.items():
-            for keyword in keywords:
-                if keyword in question_lower:
-                    entities['category'] = category.title()
-                    break
-            if 'category' in entities:
-                break
+        # Extract STEM category entities (specific academic fields)
+        # A general category found above is only refined to Computer Science
+        stem_category = keywords.get('stem_category')
+        if stem_category and ('category' not in entities or stem_category == 'computer science'):
+            entities['category'] = stem_category.title()
         
         # Extract specific program names (only if not already categorized as STEM)
         if 'category' not in entities:
-            # Look for specific program names like "Business Administration", "Nursing", etc.
-            specific_programs = ['business administration', 'nursing', 'psychology', 'education', 'social work', 'criminal justice']
-            for program in specific_programs:
-                if program in question_lower:
-                    entities['program'] = program.title()
-                    break
+            program = keywords.get('program')
+            if program:
+                entities['program'] = program.title()
         # Extract additional entity types for all 15 filters
         
         # Extract award name entities
-        award_patterns = ['bachelor of arts', 'bachelor of science', 'master of arts', 'master of science', 'associate of arts', 'associate of science']
-        for award in award_patterns:
-            if award in question_lower:
-                entities['award_name'] = award.title()
-                break
+        award = keywords.get('award_name')
+        if award:
+            entities['award_name'] = award.title()
         
         # Extract delivery format entities
-        delivery_patterns = {
-            'online': ['online', 'distance', 'remote'],
-            'hybrid': ['hybrid', 'blended'],
-            'in-person': ['in-person', 'on-campus', 'campus', 'face-to-face']
-        }
-        for format_type, keywords in delivery_patterns.items():
-            for keyword in keywords:
-                if keyword in question_lower:
-                    entities['delivery_format'] = format_type.title()
-                    break
-            if 'delivery_format' in entities:
-                break
+        format_type = keywords.get('delivery_format')
+        if format_type:
+            entities['delivery_format'] = format_type.title()
         
         # Extract enrolled college entities (separate from reporting college)
         if 'enrolled' in question_lower:
             # Look for college names after "enrolled"
-            enrolled_pattern = r'enrolled.*?(?:at|in)\s+([a-z\s]+(?:college|university))'
-            match = re.search(enrolled_pattern, question_lower)
+            match = _ENROLLED_RE.search(question_lower)
             if match:
                 entities['enrolled_college'] = match.group(1).title()
         
         # Extract college type entities
-        college_type_patterns = {
-            'community': ['community college', 'cc'],
-            'senior': ['senior college', 'four-year'],
-            'graduate': ['graduate school', 'graduate center']
-        }
-        for type_name, keywords in college_type_patterns.items():
-            for keyword in keywords:
-                if keyword in question_lower:
-                    entities['college_type'] = type_name.title()
-                    break
-            if 'college_type' in entities:
-                break
+        type_name = keywords.get('college_type')
+        if type_name:
+            entities['college_type'] = type_name.title()
         
         # Extract academic plan entities
-        academic_patterns = ['full-time', 'part-time', 'accelerated', 'evening', 'weekend']
-        for plan in academic_patterns:
-            if plan in question_lower:
-                entities['academic_plan'] = plan.title()
-                break
+        plan = keywords.get('academic_plan')
+        if plan:
+            entities['academic_plan'] = plan.title()
         
         # Extract CIP code entities
-        cip_patterns = [
-            (r'\b(\d{2})\b', 'cip_2digit'),
-            (r'\b(\d{4})\b', 'cip_4digit'), 
-            (r'\b(\d{6})\b', 'cip_6digit')
-        ]
-        for pattern, entity_key in cip_patterns:
-            matches = re.findall(pattern, question_lower)
-            if matches:
-                entities[entity_key] = matches[0]
+        for pattern, entity_key in _CIP_RES:
+            match = pattern.search(question_lower)
+            if match:
+                entities[entity_key] = match.group(1)
                 break
         
         # Extract SEVIS eligibility entities
-        if any(word in question_lower for word in ['sevis', 'international', 'f-1', 'visa']):
+        if 'sevis_eligible' in keywords:
             entities['sevis_eligible'] = 'Yes'
         
         # Extract education credentials entities
-        credential_patterns = {
-            'teacher credentials': ['teacher credentials', 'teaching credentials'],
-            'administration credentials': ['administration credentials', 'admin credentials'],
-            'counseling credentials': ['counseling credentials', 'pps credentials'],
-            'teacher aide': ['teacher aide', 'aide credentials']
-        }
-        for cred_type, keywords in credential_patterns.items():
-            for keyword in keywords:
-                if keyword in question_lower:
-                    entities['education_credentials'] = cred_type.title()
-                    break
-            if 'education_credentials' in entities:
-                break
+        cred_type = keywords.get('education_credentials')
+        if cred_type:
+            entities['education_credentials'] = cred_type.title()
         
         # Extract time entities
-        time_patterns = [r'\b(20\d{2})\b', r'\b(current|recent|latest)\b', r'\b(last\s+year|this\s+year)\b']
-        for pattern in time_patterns:
-            matches = re.findall(pattern, question_lower)
-            if matches:
-                entities['time'] = matches[0]
-                break
+        time_expression = question_patterns.find_time_expression(question_lower)
+        if time_expression:
+            entities['time'] = time_expression
         
-        return entities
+        return tuple(entities.items())
+
+# Global browser pool shared by all agent instances; the atexit hook closes it for callers
+# such as web_app that never do, while the pool's loop thread is still alive
+browser_pool = BrowserPool(int(os.getenv("TABLEAU_POOL_SIZE", "1")))
+atexit.register(browser_pool.shutdown)
 
 # Global agent instance
 tableau_agent = TableauDashboardAgent()
@@ -899,10 +1438,10 @@ async def analyze_tableau_dashboard(question: str):
     Applies appropriate filters and extracts data from charts.
     """
     try:
-        logging.info(f"Analyzing dashboard for question: {question}")
+        logging.info("Analyzing dashboard for question: %s", question)
         
         # Run Playwright analysis directly
-        data = await(tableau_agent.analyze_dashboard(question))
+        data = await tableau_agent.analyze_dashboard(question)
         
         if "error" in data:
             return {"error": data["error"]}
@@ -922,10 +1461,42 @@ async def analyze_tableau_dashboard(question: str):
         }
         
     except Exception as e:
-        logging.error(f"Failed to analyze dashboard: {e}")
+        logging.error("Failed to analyze dashboard: %s", e)
         return {"error": str(e)}
 
 
+# Example questions
+_SAMPLE_QUESTIONS = (
+    "Show me data for bachelor's degree programs",
+    "Filter by college and show me the results",
+    "What programs are available in STEM category?",
+    "Compare data across different categories",
+    "Show me trends in the data",
+    "Filter by year and program type"
+)
+_SAMPLE_BANNER = "Tableau Dashboard Agent Ready!\nSample questions you can ask:\n" + "".join(
+    f"{i}. {q}\n" for i, q in enumerate(_SAMPLE_QUESTIONS, 1)
+)
+
+def _read_questions():
+    """Yield questions from the prompt or from piped stdin, one question per line."""
+    interactive = sys.stdin.isatty()
+    while True:
+        if interactive:
+            try:
+                line = input("\nEnter your question (or 'quit' to exit): ")
+            except EOFError:
+                return
+        else:
+            line = sys.stdin.readline()
+            if not line:
+                return
+        question = line.strip()
+        if question.lower() == 'quit':
+            return
+        if question:
+            yield question
+
 def main():
     client = AgentClient(
         auth_type="api_key",
@@ -940,29 +1511,30 @@ def main():
         tools=[analyze_tableau_dashboard]
     )
 
-    # Example questions
-    sample_questions = [
-        "Show me data for bachelor's degree programs",
-        "Filter by college and show me the results",
-        "What programs are available in STEM category?",
-        "Compare data across different categories",
-        "Show me trends in the data",
-        "Filter by year and program type"
-    ]
+    sys.stdout.write(_SAMPLE_BANNER)
     
-    print("Tableau Dashboard Agent Ready!")
-    print("Sample questions you can ask:")
-    for i, q in enumerate(sample_questions, 1):
-        print(f"{i}. {q}")
+    # Repeated questions (ignoring case and spacing) reuse the agent's earlier answer while the
+    # dashboard capture behind it would still be reused; least recently asked answers go first
+    responses = collections.OrderedDict()
     
-    # Interactive mode
-    while True:
-        user_question = input("\nEnter your question (or 'quit' to exit): ")
-        if user_question.lower() == 'quit':
-            break
-            
-        response = agent.run(user_question)
-        response.pretty_print()
+    # Interactive mode, or one question per line when input is piped
+    try:
+        for user_question in _read_questions():
+            key = " ".join(user_question.lower().split())
+            cached = responses.get(key)
+            if cached and time.monotonic() - cached[0] < RESULT_CACHE_TTL:
+                responses.move_to_end(key)
+                response = cached[1]
+            else:
+                response = agent.run(user_question)
+                responses[key] = (time.monotonic(), response)
+                responses.move_to_end(key)
+                if len(responses) > RESPONSE_CACHE_SIZE:
+                    responses.popitem(last=False)
+            response.pretty_print()
+    finally:
+        # Close the browsers on the pool's loop while it is still running
+        browser_pool.shutdown()
 
 if __name__ == "__main__":
     main()
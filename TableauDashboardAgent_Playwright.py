@@ -1,8 +1,10 @@
 from oci.addons.adk import AgentClient, Agent, tool
-import os, logging, importlib, time, json, sys, subprocess
+import os, logging, logging.handlers, importlib, re, time, json, sys, subprocess, tempfile, collections
+from functools import lru_cache
 from datetime import datetime
 import requests
 from bs4 import BeautifulSoup
+import question_patterns
 
 # Load environment config
 ENV = os.getenv("ENV", "AGENT").upper()
@@ -20,12 +22,14 @@ log_dir = os.path.dirname(log_file)
 if log_dir and not os.path.exists(log_dir):
     os.makedirs(log_dir, exist_ok=True)
 
+# Buffer file writes and flush them in batches, or immediately on errors
+file_handler = logging.FileHandler(log_file, mode="a")
+file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
 logging.basicConfig(
-    filename=log_file,
-    filemode="a",
-    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[logging.handlers.MemoryHandler(1000, flushLevel=logging.ERROR, target=file_handler)],
     level=logging.DEBUG,
 )
+logging.getLogger("urllib3").setLevel(logging.WARNING)
 
 # Also log to console for debugging
 root = logging.getLogger()
@@ -35,6 +39,73 @@ if not root.handlers:
     handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
     root.addHandler(handler)
 
+# How long (seconds) and how many interactive answers main() reuses for repeated questions
+RESPONSE_CACHE_TTL = 300
+RESPONSE_CACHE_SIZE = 128
+
+# Question classification patterns, compiled once at import
+_COUNT_QUESTION_RE = re.compile(r'how many|count')
+
+# Entity keywords in priority order: when several match, the first listed wins
+_COLLEGE_KEYWORDS = (
+    ('Lehman', ('lehman',)),
+    ('Baruch', ('baruch',)),
+    ('Queens', ('queens',)),
+    ('Brooklyn', ('brooklyn',)),
+    ('Hunter', ('hunter',)),
+    ('City College', ('city college',)),
+    ('Bronx', ('bronx',)),
+    ('Staten Island', ('staten island',))
+)
+_DEGREE_KEYWORDS = (
+    ("Bachelor's", ('bachelor', 'bachelors', 'bachelor\'s')),
+    ("Master's", ('master', 'masters', 'master\'s')),
+    ('Associate', ('associate',)),
+    ('Certificate', ('certificate',)),
+    ('Doctoral', ('doctoral', 'phd', 'doctorate'))
+)
+_CATEGORY_KEYWORDS = (
+    ('Stem', ('stem',)),
+    ('Business', ('business', 'commerce')),
+    ('Engineering', ('engineering',)),
+    ('Arts', ('arts', 'art')),
+    ('Science', ('science', 'scientific')),
+    ('Education', ('education', 'teaching')),
+    ('Medicine', ('medicine', 'medical')),
+    ('Law', ('law', 'legal')),
+    ('Technology', ('technology', 'tech'))
+)
+
+# keyword -> (entity type, priority, value), looked up by the question's words
+# and word pairs so only whole words match ("mastering" is not "master")
+_ENTITY_KEYWORDS = {}
+for _entity_type, _groups in (('location', _COLLEGE_KEYWORDS), ('degree', _DEGREE_KEYWORDS), ('category', _CATEGORY_KEYWORDS)):
+    for _priority, (_value, _keywords) in enumerate(_groups):
+        for _keyword in _keywords:
+            _ENTITY_KEYWORDS[_keyword] = (_entity_type, _priority, _value)
+_TOKEN_RE = re.compile(r"[a-z']+")
+
+_CAPWORD_RE = re.compile(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b')
+_COMMON_WORDS = frozenset({'The', 'And', 'Or', 'But', 'In', 'On', 'At', 'To', 'For', 'Of', 'With', 'By', 'From', 'How', 'What', 'When', 'Where', 'Why', 'Which', 'Who',
+                           'Show', 'Filter', 'Give', 'Tell', 'List', 'Find', 'Compare', 'Display', 'Please'})
+_LEADING_NONWORD_RE = re.compile(r'\W*')
+_DIGIT_RE = re.compile(r'\d+')
+
+
+def _program_candidate(match):
+    """Return a capitalized run of the question as a program name, or None if it is not one"""
+    phrase = match.group()
+    if _LEADING_NONWORD_RE.fullmatch(match.string, 0, match.start()):
+        # The sentence's first word is capitalized anyway: after a command word the name is
+        # the rest of the run ("Show Nursing"), otherwise it only counts inside a longer run
+        first, _, rest = phrase.partition(" ")
+        if first in _COMMON_WORDS:
+            phrase = rest
+        elif not rest:
+            return None
+    return phrase if phrase not in _COMMON_WORDS and len(phrase) > 3 else None
+
+
 class TableauDashboardAgent:
     def __init__(self):
         self.dashboard_url = l_env.TABLEAU_DASHBOARD_URL
@@ -49,6 +120,7 @@ class TableauDashboardAgent:
             script_content = f'''
 import asyncio
 import json
+import re
 import time
 import sys
 
@@ -61,15 +133,53 @@ except ImportError as e:
     print(json.dumps({{"error": "Playwright not installed. Run: pip install playwright && playwright install"}}))
     sys.exit(1)
 
+# Words that call for the Award Level filter
+DEGREE_WORDS = ('bachelor', 'master', 'associate', 'certificate', 'degree')
+
+# Selectors for each control, combined once so every lookup is a single query
+AWARD_LEVEL_SELECTOR = ", ".join((
+    'select[title*="Award Level"]',
+    'select[aria-label*="Award Level"]',
+    'div[class*="award"][class*="level"]',
+    'div[class*="tabComboBox"]:has-text("Award Level")',
+))
+STEM_CATEGORY_SELECTOR = ", ".join((
+    'select[title*="STEM Category"]',
+    'select[aria-label*="STEM Category"]',
+    'div[class*="stem"][class*="category"]',
+    'div[class*="tabComboBox"]:has-text("STEM Category")',
+))
+CIP_SELECTOR = ", ".join((
+    'select[title*="CIP"]',
+    'select[aria-label*="CIP"]',
+    'div[class*="cip"]',
+    'div[class*="tabComboBox"]:has-text("CIP")',
+))
+APPLY_BUTTON_SELECTOR = ", ".join((
+    'button:has-text("Apply")',
+    'button[class*="apply"]',
+    'input[type="button"][value*="Apply"]',
+    'div[class*="apply"] button',
+    'button[title*="Apply"]',
+    'input[value="Apply"]',
+    'button[data-testid*="apply"]',
+    'button[id*="apply"]',
+    'div[role="button"]:has-text("Apply")',
+    'a[role="button"]:has-text("Apply")',
+))
+
+# vizql /commands/ responses since the last filter action; their dataSegments describe the filtered view
+VIZQL_COMMANDS = []
+
 async def apply_filters_based_on_question(page, question):
-    """Apply appropriate filters based on the user's question"""
+    """Apply appropriate filters based on the user's question; returns the filters applied"""
     filters_applied = []
     
     try:
         print(f"Analyzing question: {{question}}")
         
         # Apply Award Level filter for degree-related questions
-        if any(word in question for word in ['bachelor', 'master', 'associate', 'certificate', 'degree']):
+        if any(word in question for word in DEGREE_WORDS):
             print("Applying Award Level filter...")
             result = await apply_award_level_filter(page, question)
             if result:
@@ -91,8 +201,9 @@ async def apply_filters_based_on_question(page, question):
         
         print(f"Applied filters: {{filters_applied}}")
         
-        # Click Apply button to reload dashboard
+        # Click Apply button to reload dashboard; earlier responses predate the final filter state
         print("Clicking Apply button...")
+        VIZQL_COMMANDS.clear()
         apply_result = await click_apply_button(page)
         print(f"Apply button clicked: {{apply_result}}")
         
@@ -103,54 +214,43 @@ async def apply_filters_based_on_question(page, question):
         
     except Exception as e:
         print(f"Error applying filters: {{e}}")
+    return filters_applied
 
 async def apply_award_level_filter(page, question):
     """Apply Award Level filter"""
     try:
         # Look for Award Level dropdown
-        award_selectors = [
-            'select[title*="Award Level"]',
-            'select[aria-label*="Award Level"]',
-            'div[class*="award"][class*="level"]',
-            'div[class*="tabComboBox"]:has-text("Award Level")'
-        ]
-        
-        for selector in award_selectors:
-            try:
-                element = await page.query_selector(selector)
-                if element:
-                    # For select elements
-                    tag_name = await element.evaluate("el => el.tagName")
-                    if tag_name.lower() == 'select':
-                        if 'bachelor' in question:
-                            await element.select_option(label="Bachelor's")
-                        elif 'master' in question:
-                            await element.select_option(label="Master's")
-                        elif 'associate' in question:
-                            await element.select_option(label="Associate")
-                        print(f"Applied Award Level filter")
-                        return True
+        element = await page.query_selector(AWARD_LEVEL_SELECTOR)
+        if element:
+            # For select elements
+            tag_name = await element.evaluate("el => el.tagName")
+            if tag_name.lower() == 'select':
+                if 'bachelor' in question:
+                    await element.select_option(label="Bachelor's")
+                elif 'master' in question:
+                    await element.select_option(label="Master's")
+                elif 'associate' in question:
+                    await element.select_option(label="Associate")
+                print(f"Applied Award Level filter")
+                return True
                     
-                    # For Tableau dropdown elements
-                    else:
-                        await element.click()
-                        await asyncio.sleep(1)
+            # For Tableau dropdown elements
+            else:
+                await element.click()
                         
-                        # Look for the option
-                        if 'bachelor' in question:
-                            option = await page.query_selector('div:has-text("Bachelor\\'s"), li:has-text("Bachelor\\'s")')
-                        elif 'master' in question:
-                            option = await page.query_selector('div:has-text("Master\\'s"), li:has-text("Master\\'s")')
-                        elif 'associate' in question:
-                            option = await page.query_selector('div:has-text("Associate"), li:has-text("Associate")')
+                # Look for the option
+                if 'bachelor' in question:
+                    option = await page.wait_for_selector('div:has-text("Bachelor\\'s"), li:has-text("Bachelor\\'s")', state='visible', timeout=5000)
+                elif 'master' in question:
+                    option = await page.wait_for_selector('div:has-text("Master\\'s"), li:has-text("Master\\'s")', state='visible', timeout=5000)
+                elif 'associate' in question:
+                    option = await page.wait_for_selector('div:has-text("Associate"), li:has-text("Associate")', state='visible', timeout=5000)
                         
-                        if option:
-                            await option.click()
-                            await asyncio.sleep(1)
-                            print(f"Applied Award Level filter")
-                            return True
-            except:
-                continue
+                if option:
+                    await option.click()
+                    await wait_for_dashboard_idle(page)
+                    print(f"Applied Award Level filter")
+                    return True
     except Exception as e:
         print(f"Error applying Award Level filter: {{e}}")
     return False
@@ -159,38 +259,26 @@ async def apply_stem_category_filter(page, category):
     """Apply STEM Category filter"""
     try:
         # Look for STEM Category dropdown
-        stem_selectors = [
-            'select[title*="STEM Category"]',
-            'select[aria-label*="STEM Category"]',
-            'div[class*="stem"][class*="category"]',
-            'div[class*="tabComboBox"]:has-text("STEM Category")'
-        ]
-        
-        for selector in stem_selectors:
-            try:
-                element = await page.query_selector(selector)
-                if element:
-                    # For select elements
-                    tag_name = await element.evaluate("el => el.tagName")
-                    if tag_name.lower() == 'select':
-                        await element.select_option(label=category)
-                        print(f"Applied STEM Category filter: {{category}}")
-                        return True
+        element = await page.query_selector(STEM_CATEGORY_SELECTOR)
+        if element:
+            # For select elements
+            tag_name = await element.evaluate("el => el.tagName")
+            if tag_name.lower() == 'select':
+                await element.select_option(label=category)
+                print(f"Applied STEM Category filter: {{category}}")
+                return True
                     
-                    # For Tableau dropdown elements
-                    else:
-                        await element.click()
-                        await asyncio.sleep(1)
+            # For Tableau dropdown elements
+            else:
+                await element.click()
                         
-                        # Look for the option
-                        option = await page.query_selector(f'div:has-text("{{category}}"), li:has-text("{{category}}")')
-                        if option:
-                            await option.click()
-                            await asyncio.sleep(1)
-                            print(f"Applied STEM Category filter: {{category}}")
-                            return True
-            except:
-                continue
+                # Look for the option
+                option = await page.wait_for_selector(f'div:has-text("{{category}}"), li:has-text("{{category}}")', state='visible', timeout=5000)
+                if option:
+                    await option.click()
+                    await wait_for_dashboard_idle(page)
+                    print(f"Applied STEM Category filter: {{category}}")
+                    return True
     except Exception as e:
         print(f"Error applying STEM Category filter: {{e}}")
     return False
@@ -199,43 +287,31 @@ async def apply_cip_filter(page, program):
     """Apply CIP Code filter"""
     try:
         # Look for CIP Code dropdowns
-        cip_selectors = [
-            'select[title*="CIP"]',
-            'select[aria-label*="CIP"]',
-            'div[class*="cip"]',
-            'div[class*="tabComboBox"]:has-text("CIP")'
-        ]
-        
-        for selector in cip_selectors:
-            try:
-                element = await page.query_selector(selector)
-                if element:
-                    # For select elements
-                    tag_name = await element.evaluate("el => el.tagName")
-                    if tag_name.lower() == 'select':
-                        # Look for Computer Science option
-                        options = await element.query_selector_all('option')
-                        for option in options:
-                            text = await option.text_content()
-                            if text and 'Computer Science' in text:
-                                await element.select_option(label=text)
-                                print(f"Applied CIP filter: {{text}}")
-                                return True
+        element = await page.query_selector(CIP_SELECTOR)
+        if element:
+            # For select elements
+            tag_name = await element.evaluate("el => el.tagName")
+            if tag_name.lower() == 'select':
+                # Look for Computer Science option
+                options = await element.query_selector_all('option')
+                for option in options:
+                    text = await option.text_content()
+                    if text and 'Computer Science' in text:
+                        await element.select_option(label=text)
+                        print(f"Applied CIP filter: {{text}}")
+                        return True
                     
-                    # For Tableau dropdown elements
-                    else:
-                        await element.click()
-                        await asyncio.sleep(1)
+            # For Tableau dropdown elements
+            else:
+                await element.click()
                         
-                        # Look for Computer Science option
-                        option = await page.query_selector('div:has-text("Computer Science"), li:has-text("Computer Science")')
-                        if option:
-                            await option.click()
-                            await asyncio.sleep(1)
-                            print("Applied CIP filter: Computer Science")
-                            return True
-            except:
-                continue
+                # Look for Computer Science option
+                option = await page.wait_for_selector('div:has-text("Computer Science"), li:has-text("Computer Science")', state='visible', timeout=5000)
+                if option:
+                    await option.click()
+                    await wait_for_dashboard_idle(page)
+                    print("Applied CIP filter: Computer Science")
+                    return True
     except Exception as e:
         print(f"Error applying CIP filter: {{e}}")
     return False
@@ -244,29 +320,11 @@ async def click_apply_button(page):
     """Click the Apply button to reload the dashboard"""
     try:
         # Look for Apply button with various selectors
-        apply_selectors = [
-            'button:has-text("Apply")',
-            'button[class*="apply"]',
-            'input[type="button"][value*="Apply"]',
-            'div[class*="apply"] button',
-            'button[title*="Apply"]',
-            'button:has-text("APPLY")',
-            'input[value="Apply"]',
-            'button[data-testid*="apply"]',
-            'button[id*="apply"]',
-            'div[role="button"]:has-text("Apply")',
-            'a[role="button"]:has-text("Apply")'
-        ]
-        
-        for selector in apply_selectors:
-            try:
-                apply_button = await page.query_selector(selector)
-                if apply_button:
-                    await apply_button.click()
-                    print("Clicked Apply button")
-                    return True
-            except:
-                continue
+        apply_button = await page.query_selector(APPLY_BUTTON_SELECTOR)
+        if apply_button:
+            await apply_button.click()
+            print("Clicked Apply button")
+            return True
         
         print("Could not find Apply button")
         return False
@@ -275,16 +333,62 @@ async def click_apply_button(page):
         print(f"Error clicking Apply button: {{e}}")
         return False
 
+def parse_vizql_payload(text):
+    """Split a vizql response into its JSON blocks (bootstrap responses are length-prefixed frames)"""
+    decoder = json.JSONDecoder()
+    frame_prefix = re.compile(r'\\s*\\d+;')
+    blocks = []
+    pos = 0
+    while True:
+        match = frame_prefix.match(text, pos)
+        if not match:
+            break
+        block, pos = decoder.raw_decode(text, match.end())
+        blocks.append(block)
+    return blocks or [json.loads(text)]
+
+def collect_data_segments(node, segments):
+    """Merge every dataSegments map found in a vizql payload, later segments replacing earlier ones"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "dataSegments" and isinstance(value, dict):
+                segments.update(value)
+            else:
+                collect_data_segments(value, segments)
+    elif isinstance(node, list):
+        for item in node:
+            collect_data_segments(item, segments)
+
+def extract_vizql_data_values(payloads):
+    """Group the data dictionary values Tableau sent over the wire by data type"""
+    segments = {{}}
+    for text in payloads:
+        try:
+            for block in parse_vizql_payload(text):
+                collect_data_segments(block, segments)
+        except Exception as e:
+            print(f"Could not parse vizql payload: {{e}}")
+    data_values = {{}}
+    for segment in segments.values():
+        for column in segment.get("dataColumns", []):
+            data_values.setdefault(column.get("dataType", "unknown"), []).extend(column.get("dataValues", []))
+    return data_values
+
+async def wait_for_dashboard_idle(page, timeout=10000):
+    """Wait for Tableau's loading indicators to clear instead of sleeping"""
+    # Only Tableau's own overlays: broader class matches can hit elements that never hide
+    try:
+        await page.wait_for_selector('.tab-loading-indicator, .tab-glass', state='hidden', timeout=timeout)
+    except Exception as e:
+        print(f"Loading indicator still visible, continuing: {{e}}")
+
 async def wait_for_dashboard_reload(page):
     """Wait for the dashboard to fully reload with filtered data"""
     try:
         print("Waiting for dashboard to reload...")
         
         # Wait for any loading indicators to disappear
-        try:
-            await page.wait_for_selector('.loading, .spinner, [class*="loading"]', state='hidden', timeout=10000)
-        except:
-            pass
+        await wait_for_dashboard_idle(page)
         
         # Wait for Tableau-specific elements to be ready
         try:
@@ -300,18 +404,16 @@ async def wait_for_dashboard_reload(page):
         except:
             print("Network idle timeout, continuing...")
         
-        # Additional wait for dynamic content
-        await asyncio.sleep(10)
-        print("Additional wait completed")
-        
         # Wait for specific data elements to appear
         try:
             await page.wait_for_function("""
                 () => {{
-                    const elements = document.querySelectorAll('div, span, td, th');
+                    const COUNT_RE = /[A-Za-z\\s]+:\\s*\\d+/;
+                    const root = document.getElementById('centeringContainer') || document.body;
+                    const elements = root.querySelectorAll('div, span, td, th');
                     for (let el of elements) {{
                         const text = el.textContent || '';
-                        if (text.match(/[A-Za-z\\s]+:\\s*\\d+/)) {{
+                        if (text.includes(':') && COUNT_RE.test(text)) {{
                             return true;
                         }}
                     }}
@@ -326,7 +428,7 @@ async def wait_for_dashboard_reload(page):
         
     except Exception as e:
         print(f"Error waiting for dashboard reload: {{e}}")
-        await asyncio.sleep(15)
+        await wait_for_dashboard_idle(page, timeout=15000)
 
 async def analyze_dashboard():
     try:
@@ -340,96 +442,114 @@ async def analyze_dashboard():
                 "--disable-features=VizDisplayCompositor",
                 "--disable-extensions",
                 "--disable-plugins",
-                "--disable-images"
+                # Only DOM text is read, so skip image decoding and background work
+                "--blink-settings=imagesEnabled=false",
+                "--disable-background-networking",
+                "--disable-sync",
+                "--disable-translate",
+                "--mute-audio",
+                "--disk-cache-size=67108864"
             ]
         )
         page = await browser.new_page(viewport={{"width": 1920, "height": 1080}})
-        page.set_default_timeout(60000)
+        # Keep missed clicks short; navigation and render waits pass their own timeouts
+        page.set_default_timeout(10000)
+        
+        # The viz receives filter results as JSON; keep those responses instead of re-fetching.
+        # bootstrapSession is skipped: it carries the unfiltered model
+        async def capture_vizql(response):
+            if "/vizql/" in response.url and "/commands/" in response.url:
+                try:
+                    VIZQL_COMMANDS.append(await response.text())
+                except Exception:
+                    pass
+        page.on("response", capture_vizql)
         
         # Navigate to dashboard
         await page.goto("{self.dashboard_url}", wait_until="domcontentloaded", timeout=60000)
-        await page.wait_for_selector("body", timeout=30000)
-        await asyncio.sleep(5)
+        
+        # Wait for the Tableau canvas to render instead of a fixed pause
+        try:
+            await page.wait_for_selector('[class*="tabCanvas"], [class*="tab-viz"]', timeout=30000)
+        except:
+            print("Tableau canvas not found, continuing...")
         
         # Get page title
         title = await page.title()
         
         # Apply filters based on question
         print("Starting filter application...")
-        await apply_filters_based_on_question(page, "{question}")
+        filters_applied = await apply_filters_based_on_question(page, "{question}")
         print("Filter application completed")
         
-        # Extract text content after applying filters
-        text_content = await page.evaluate("""
-            () => {{
-                const elements = document.querySelectorAll('div, span, p, h1, h2, h3, h4, h5, h6');
-                let text = '';
-                elements.forEach(el => {{
-                    if (el.textContent && el.textContent.trim()) {{
-                        text += el.textContent.trim() + '\\n';
-                    }}
-                }});
-                return text;
-            }}
-        """)
-        
-        # Look for filter elements
-        filter_elements = await page.evaluate("""
+        # Extract text, filters, charts and program counts in one round-trip and one DOM pass
+        extracted = await page.evaluate("""
             () => {{
+                const TEXT_SELECTOR = 'div, span, p, h1, h2, h3, h4, h5, h6';
+                const COUNT_SELECTOR = 'div, span, td, th';
+                const FILTER_SELECTOR = 'div[class*="tabComboBox"], div[class*="filter"], select, div[role="button"]';
+                const CHART_SELECTOR = 'div[class*="tab-viz"], svg, canvas, div[class*="chart"]';
+                const textTags = new Set(['DIV', 'SPAN', 'P', 'H1', 'H2', 'H3', 'H4', 'H5', 'H6']);
+                const countTags = new Set(['DIV', 'SPAN', 'TD', 'TH']);
+                // Compiled once per extraction rather than once per element
+                const COUNT_RE = /([A-Za-z\\s]+):\\s*(\\d+)/;
+                
+                const textLines = [];
+                // Labelled counts travel as two parallel columns instead of one object per match
+                const countLabels = [];
+                const countValues = [];
                 const filters = [];
-                const elements = document.querySelectorAll('div[class*="tabComboBox"], div[class*="filter"], select, div[role="button"]');
-                elements.forEach(el => {{
-                    const text = el.textContent || el.getAttribute('title') || el.getAttribute('aria-label') || '';
-                    if (text.trim()) {{
-                        filters.push({{
-                            text: text.trim(),
-                            tagName: el.tagName,
-                            className: el.className
-                        }});
-                    }}
-                }});
-                return filters;
-            }}
-        """)
-        
-        # Look for chart data
-        chart_data = await page.evaluate("""
-            () => {{
                 const charts = [];
-                const elements = document.querySelectorAll('div[class*="tab-viz"], svg, canvas, div[class*="chart"]');
-                elements.forEach(el => {{
+                // Nested matches belong to the same control, so keep one entry per control element
+                const seenControls = new Set();
+                
+                // Tableau renders the whole dashboard inside the centering container; skip the page around it
+                const root = document.getElementById('centeringContainer') || document.body;
+                
+                // Each element's text is read once and shared by every bucket it belongs to
+                const allSelectors = [TEXT_SELECTOR, COUNT_SELECTOR, FILTER_SELECTOR, CHART_SELECTOR].join(', ');
+                root.querySelectorAll(allSelectors).forEach(el => {{
+                    // Collapsed and display:none elements are not part of the rendered dashboard
+                    const rect = el.getBoundingClientRect();
+                    if (rect.width === 0 || rect.height === 0) return;
                     const text = el.textContent || '';
-                    if (text.trim()) {{
-                        charts.push({{
-                            text: text.trim(),
-                            tagName: el.tagName,
-                            className: el.className
-                        }});
+                    const trimmed = text.trim();
+                    if (textTags.has(el.tagName) && trimmed) {{
+                        textLines.push(trimmed + '\\\\n');
                     }}
-                }});
-                return charts;
-            }}
-        """)
-        
-        # Look for specific program count data
-        program_counts = await page.evaluate("""
-            () => {{
-                const counts = [];
-                const elements = document.querySelectorAll('div, span, td, th');
-                elements.forEach(el => {{
-                    const text = el.textContent || '';
-                    const match = text.match(/([A-Za-z\\s]+):\\s*(\\d+)/);
-                    if (match) {{
-                        counts.push({{
-                            college: match[1].trim(),
-                            count: match[2],
-                            fullText: text.trim()
-                        }});
+                    // Every labelled count contains a colon, so skip the regex for text without one
+                    if (countTags.has(el.tagName) && text.includes(':')) {{
+                        const match = COUNT_RE.exec(text);
+                        if (match) {{
+                            countLabels.push(match[1].trim());
+                            countValues.push(match[2]);
+                        }}
+                    }}
+                    if (el.matches(FILTER_SELECTOR)) {{
+                        const control = el.closest('[role="button"], select') || el;
+                        if (!seenControls.has(control)) {{
+                            seenControls.add(control);
+                            const label = (text || el.getAttribute('title') || el.getAttribute('aria-label') || '').trim();
+                            if (label) {{
+                                filters.push({{text: label, tagName: el.tagName, className: el.className}});
+                            }}
+                        }}
+                    }}
+                    if (trimmed && el.matches(CHART_SELECTOR)) {{
+                        charts.push({{text: trimmed, tagName: el.tagName, className: el.className}});
                     }}
                 }});
-                return counts;
+                
+                return {{textContent: textLines.join(''), filters, charts, countLabels, countValues}};
             }}
         """)
+        text_content = extracted["textContent"]
+        filter_elements = extracted["filters"]
+        chart_data = extracted["charts"]
+        program_counts = [{{"college": college, "count": count}} for college, count in zip(extracted["countLabels"], extracted["countValues"])]
+        
+        # Without an applied filter the command responses are not tied to the question
+        data_values = extract_vizql_data_values(VIZQL_COMMANDS) if filters_applied else {{}}
         
         result = {{
             "title": title,
@@ -437,6 +557,7 @@ async def analyze_dashboard():
             "filters": filter_elements,
             "charts": chart_data,
             "program_counts": program_counts,
+            "data_values": data_values,
             "question": "{question}",
             "url": page.url
         }}
@@ -454,26 +575,29 @@ result = asyncio.run(analyze_dashboard())
 print(json.dumps(result))
 '''
             
-            # Write script to temporary file
-            script_path = "/tmp/tableau_analysis.py"
-            with open(script_path, 'w') as f:
+            # Write script to a per-call temporary file so concurrent questions don't clobber each other
+            with tempfile.NamedTemporaryFile('w', prefix="tableau_analysis_", suffix=".py", delete=False) as f:
                 f.write(script_content)
+                script_path = f.name
             
             # Run the script with much longer timeout for Tableau loading
-            result = subprocess.run([sys.executable, script_path], 
-                                  capture_output=True, text=True, timeout=300)
+            try:
+                result = subprocess.run([sys.executable, script_path], 
+                                      capture_output=True, text=True, timeout=300)
+            finally:
+                os.remove(script_path)
             
-            logging.info(f"Script return code: {result.returncode}")
-            logging.info(f"Script stdout: {result.stdout[:500]}...")  # First 500 chars
-            logging.info(f"Script stderr: {result.stderr[:500]}...")  # First 500 chars
+            logging.info("Script return code: %s", result.returncode)
+            logging.info("Script stdout: %s...", result.stdout[:500])  # First 500 chars
+            logging.info("Script stderr: %s...", result.stderr[:500])  # First 500 chars
             
             if result.returncode == 0:
                 if result.stdout.strip():
                     try:
                         return json.loads(result.stdout)
                     except json.JSONDecodeError as e:
-                        logging.error(f"JSON decode error: {e}")
-                        logging.error(f"Raw stdout: {result.stdout}")
+                        logging.error("JSON decode error: %s", e)
+                        logging.error("Raw stdout: %s", result.stdout)
                         return {"error": f"Invalid JSON output: {result.stdout[:200]}"}
                 else:
                     return {"error": "Script returned empty output"}
@@ -481,18 +605,20 @@ print(json.dumps(result))
                 return {"error": f"Script failed with return code {result.returncode}: {result.stderr}"}
                 
         except Exception as e:
-            logging.error(f"Failed to run Playwright script: {e}")
+            logging.error("Failed to run Playwright script: %s", e)
             return {"error": str(e)}
     
     def analyze_dashboard_data(self, question, data):
         """Analyze the extracted data and generate insights"""
         try:
             # Handle truncated questions by expanding common patterns
-            expanded_question = self.expand_truncated_question(question)
-            logging.info(f"Original question: '{question}' -> Expanded: '{expanded_question}'")
+            question_lower = question.lower()
+            expanded_question = self.expand_truncated_question(question, question_lower)
+            logging.info("Original question: '%s' -> Expanded: '%s'", question, expanded_question)
             
             # Extract entities from expanded question
-            entities = self.extract_entities_from_question(expanded_question.lower())
+            expanded_lower = expanded_question.lower()
+            is_count_question = bool(_COUNT_QUESTION_RE.search(expanded_lower))
             
             # Parse text content for relevant information
             text_content = data.get("text_content", "")
@@ -500,18 +626,33 @@ print(json.dumps(result))
             charts = data.get("charts", [])
             program_counts = data.get("program_counts", [])
             
+            # Nothing was extracted, so no entity can be matched against the page
+            if not (text_content or filters or charts or program_counts or data.get("data_values", {}).get("integer")):
+                return "🔢 No specific count found in the data" if is_count_question else "Dashboard analysis completed successfully."
+            
+            entities = self.extract_entities_from_question(expanded_lower, expanded_question)
+            
+            # Chart records are only ever read for their text; pull it out once for every use below.
+            # Nested chart elements repeat the same text, so keep each distinct text once (in order)
+            chart_texts = list(dict.fromkeys(chart["text"] for chart in charts))
+            
+            # Prefer a program name the dashboard itself shows over the capitalized-word guess
+            dashboard_program = self.match_dashboard_program(expanded_lower, chart_texts)
+            if dashboard_program:
+                entities['program'] = dashboard_program
+            
             # Look for count/number questions
             response_parts = []
             
-            if "how many" in expanded_question.lower() or "count" in expanded_question.lower():
+            if is_count_question:
                 # First try to find specific college counts
-                entities = self.extract_entities_from_question(expanded_question.lower())
                 college_name = entities.get('location', '')
                 
                 if college_name and program_counts:
                     # Look for the specific college in program counts
+                    college_lower = college_name.lower()
                     for count_data in program_counts:
-                        if college_name.lower() in count_data['college'].lower():
+                        if college_lower in count_data['college'].lower():
                             response_parts.append(f"🔢 **Answer: {count_data['count']} programs at {college_name}**")
                             break
                     else:
@@ -522,13 +663,14 @@ print(json.dumps(result))
                         else:
                             response_parts.append("🔢 No specific count found in the data")
                 else:
-                    # Fallback to extracting numbers from text content
-                    import re
-                    numbers = re.findall(r'\d+', text_content)
-                    large_numbers = [n for n in numbers if int(n) >= 10]
+                    # Fallback to numbers in the text content, then to the integers of the filtered vizql responses
+                    # Stream the numbers through one max() without building intermediate lists
+                    numbers = (int(m.group()) for m in _DIGIT_RE.finditer(text_content))
+                    main_answer = max((n for n in numbers if n >= 10), default=None)
+                    if main_answer is None:
+                        main_answer = max((n for n in map(int, data.get("data_values", {}).get("integer", ())) if n >= 10), default=None)
                     
-                    if large_numbers:
-                        main_answer = max(large_numbers, key=int)
+                    if main_answer is not None:
                         response_parts.append(f"🔢 **Answer: {main_answer}**")
                     else:
                         response_parts.append("🔢 No specific count found in the data")
@@ -540,17 +682,16 @@ print(json.dumps(result))
             
             # Add chart information
             if charts:
-                chart_info = [c["text"][:100] for c in charts[:3]]  # Limit length
+                chart_info = [text[:100] for text in chart_texts[:3]]  # Limit length
                 response_parts.append(f"📊 **Chart data:** {', '.join(chart_info)}")
             
             # Add entity-specific information
+            chart_texts_lower = [text.lower() for text in chart_texts]
             for entity_type, entity_value in entities.items():
                 if entity_value:
                     # Look for data containing this entity
-                    relevant_data = []
-                    for chart in charts:
-                        if entity_value.lower() in chart["text"].lower():
-                            relevant_data.append(chart["text"][:100])
+                    entity_lower = entity_value.lower()
+                    relevant_data = [text[:100] for text, text_lower in zip(chart_texts, chart_texts_lower) if entity_lower in text_lower]
                     
                     if relevant_data:
                         response_parts.append(f"🎯 **{entity_value} data:** {', '.join(relevant_data[:2])}")
@@ -558,7 +699,7 @@ print(json.dumps(result))
             # Add general text insights
             if text_content:
                 # Extract key phrases
-                lines = [line.strip() for line in text_content.split('\n') if line.strip()]
+                lines = list(dict.fromkeys(line.strip() for line in text_content.split('\n') if line.strip()))
                 key_lines = [line for line in lines if len(line) > 10 and len(line) < 200][:5]
                 if key_lines:
                     response_parts.append(f"📋 **Dashboard content:** {', '.join(key_lines)}")
@@ -566,132 +707,95 @@ print(json.dumps(result))
             return "\n".join(response_parts) if response_parts else "Dashboard analysis completed successfully."
             
         except Exception as e:
-            logging.error(f"Failed to analyze dashboard data: {e}")
+            logging.error("Failed to analyze dashboard data: %s", e)
             return f"Analysis error: {str(e)}"
     
-    def expand_truncated_question(self, question):
+    def match_dashboard_program(self, question_lower, texts):
+        """Return the longest capitalized phrase from the dashboard's charts that the question mentions"""
+        # Each run of capitalized words is a candidate name once common words and
+        # college/degree keywords are trimmed off its ends ("Lehman Computer Science Bachelor")
+        def is_edge_noise(word):
+            return word in _COMMON_WORDS or _ENTITY_KEYWORDS.get(word.lower(), ("",))[0] in ("location", "degree")
+        
+        vocabulary = {}
+        for text in texts:
+            for phrase in _CAPWORD_RE.findall(text):
+                words = phrase.split()
+                while words and is_edge_noise(words[0]):
+                    words.pop(0)
+                while words and is_edge_noise(words[-1]):
+                    words.pop()
+                candidate = " ".join(words)
+                if len(candidate) > 3 and candidate.lower() not in _ENTITY_KEYWORDS:
+                    vocabulary.setdefault(candidate.lower(), candidate)
+        if not vocabulary:
+            return None
+        
+        # Scan the question's word n-grams, longest first
+        words = _TOKEN_RE.findall(question_lower)
+        longest = max(key.count(" ") + 1 for key in vocabulary)
+        for size in range(min(longest, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                candidate = vocabulary.get(" ".join(words[start:start + size]))
+                if candidate:
+                    return candidate
+        return None
+    
+    @staticmethod
+    def expand_truncated_question(question, question_lower=None):
         """Expand truncated questions to their likely full form"""
-        question_lower = question.lower()
-        
-        # Common truncation patterns and their expansions
-        expansions = {
-            "show me data for bachelor": "show me data for bachelor's programs",
-            "show me data for master": "show me data for master's programs", 
-            "show me data for associate": "show me data for associate programs",
-            "show me data for certificate": "show me data for certificate programs",
-            "how many bachelor": "how many bachelor's programs",
-            "how many master": "how many master's programs",
-            "how many associate": "how many associate programs",
-            "how many certificate": "how many certificate programs",
-            "filter by college": "filter by college and show results",
-            "filter by degree": "filter by degree level and show results",
-            "filter by program": "filter by program type and show results",
-            "compare data": "compare data across different categories",
-            "show me trends": "show me trends in the data over time",
-            "show me charts": "show me charts and visualizations",
-            "show me graphs": "show me graphs and charts"
-        }
-        
-        # Check for exact matches first
-        for truncated, expanded in expansions.items():
-            if question_lower == truncated:
-                return expanded
-        
-        # Check for partial matches
-        for truncated, expanded in expansions.items():
-            if truncated in question_lower:
-                return expanded
-        
-        # If no match found, return original question
-        return question
+        return question_patterns.expand_truncated_question(question, question_lower)
     
-    def extract_entities_from_question(self, question_lower):
-        """Extract entities from question"""
+    def extract_entities_from_question(self, question_lower, question=None):
+        """Extract entities from question; question, if given, keeps the user's capitalization for program names"""
+        # Callers refine the result (e.g. the dashboard's program name), so each gets its own dict
+        return dict(self._extract_entities_cached(question_lower, question))
+
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _extract_entities_cached(question_lower, question):
+        """Entity extraction proper, memoized on the question"""
         entities = {}
-        import re
-        
-        # Extract location entities (colleges, universities, etc.)
-        college_names = ['lehman', 'baruch', 'queens', 'brooklyn', 'hunter', 'city college', 'bronx', 'staten island']
-        for college in college_names:
-            if college in question_lower:
-                if college == 'lehman':
-                    entities['location'] = 'Lehman'
-                elif college == 'city college':
-                    entities['location'] = 'City College'
-                else:
-                    entities['location'] = college.title()
-                break
-        
-        # If no specific college found, try regex patterns
-        if 'location' not in entities:
-            location_patterns = [
-                r'\b([a-z]+(?:\s+[a-z]+)*)\s+(?:college|university|school|institution)\b',
-                r'\b([a-z]+(?:\s+[a-z]+)*)\s+(?:city|state|county)\b'
-            ]
-            
-            for pattern in location_patterns:
-                matches = re.findall(pattern, question_lower)
-                if matches:
-                    entities['location'] = matches[0].title()
-                    break
-        
-        # Extract degree level entities
-        degree_patterns = {
-            'bachelor': ['bachelor', 'bachelors', 'bachelor\'s'],
-            'master': ['master', 'masters', 'master\'s'],
-            'associate': ['associate'],
-            'certificate': ['certificate'],
-            'doctoral': ['doctoral', 'phd', 'doctorate']
-        }
         
-        for degree_type, keywords in degree_patterns.items():
-            for keyword in keywords:
-                if keyword in question_lower:
-                    entities['degree'] = degree_type.title() + ("'s" if degree_type in ['bachelor', 'master'] else "")
-                    break
-            if 'degree' in entities:
-                break
-        
-        # Extract category entities (STEM, Business, etc.)
-        category_patterns = {
-            'stem': ['stem'],
-            'business': ['business', 'commerce'],
-            'engineering': ['engineering'],
-            'arts': ['arts', 'art'],
-            'science': ['science', 'scientific'],
-            'education': ['education', 'teaching'],
-            'medicine': ['medicine', 'medical'],
-            'law': ['law', 'legal'],
-            'technology': ['technology', 'tech']
-        }
+        # Find every location, degree and category keyword with set lookups
+        words = _TOKEN_RE.findall(question_lower)
+        terms = set(words)
+        terms.update(word[:-2] for word in words if word.endswith("'s"))
+        terms.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        best_matches = {}
+        for term in terms & _ENTITY_KEYWORDS.keys():
+            entity_type, priority, value = _ENTITY_KEYWORDS[term]
+            if entity_type not in best_matches or priority < best_matches[entity_type][0]:
+                best_matches[entity_type] = (priority, value)
         
-        for category, keywords in category_patterns.items():
-            for keyword in keywords:
-                if keyword in question_lower:
-                    entities['category'] = category.title()
-                    break
-            if 'category' in entities:
-                break
+        # Extract location entities (colleges, universities, etc.)
+        if 'location' in best_matches:
+            entities['location'] = best_matches['location'][1]
+        else:
+            # If no specific college found, try regex patterns
+            location = question_patterns.find_location(question_lower)
+            if location:
+                entities['location'] = location
+        
+        # Extract degree level and category entities (STEM, Business, etc.)
+        for entity_type in ('degree', 'category'):
+            if entity_type in best_matches:
+                entities[entity_type] = best_matches[entity_type][1]
         
         # Extract program/subject entities (any capitalized words that might be programs)
-        program_words = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b', question_lower.title())
-        
-        # Filter out common words and keep potential program names
-        common_words = {'The', 'And', 'Or', 'But', 'In', 'On', 'At', 'To', 'For', 'Of', 'With', 'By', 'From', 'How', 'What', 'When', 'Where', 'Why', 'Which', 'Who'}
-        potential_programs = [word for word in program_words if word not in common_words and len(word) > 3]
+        # Only the user's own capitalization marks a name; a lowercased question has none
+        # Filter out common words and stop at the first potential program name
+        program = next(filter(None, map(_program_candidate, _CAPWORD_RE.finditer(question or question_lower))), None)
         
-        if potential_programs:
-            entities['program'] = potential_programs[0]
+        if program:
+            entities['program'] = program
         
         # Extract time entities
-        time_patterns = [r'\b(20\d{2})\b', r'\b(current|recent|latest)\b', r'\b(last\s+year|this\s+year)\b']
-        for pattern in time_patterns:
-            matches = re.findall(pattern, question_lower)
-            if matches:
-                entities['time'] = matches[0]
-                break
+        time_expression = question_patterns.find_time_expression(question_lower)
+        if time_expression:
+            entities['time'] = time_expression
         
-        return entities
+        return tuple(entities.items())
 
 # Global agent instance
 tableau_agent = TableauDashboardAgent()
@@ -703,7 +807,7 @@ def analyze_tableau_dashboard(question: str):
     Applies appropriate filters and extracts data from charts.
     """
     try:
-        logging.info(f"Analyzing dashboard for question: {question}")
+        logging.info("Analyzing dashboard for question: %s", question)
         
         # Run Playwright analysis in separate process
         data = tableau_agent.run_playwright_script(question)
@@ -726,7 +830,7 @@ def analyze_tableau_dashboard(question: str):
         }
         
     except Exception as e:
-        logging.error(f"Failed to analyze dashboard: {e}")
+        logging.error("Failed to analyze dashboard: %s", e)
         return {"error": str(e)}
 
 
@@ -759,13 +863,27 @@ def main():
     for i, q in enumerate(sample_questions, 1):
         print(f"{i}. {q}")
     
+    # Repeated questions (ignoring case and spacing) reuse the agent's earlier answer while it is
+    # fresh; least recently asked answers are evicted first
+    responses = collections.OrderedDict()
+    
     # Interactive mode
     while True:
         user_question = input("\nEnter your question (or 'quit' to exit): ")
         if user_question.lower() == 'quit':
             break
             
-        response = agent.run(user_question)
+        key = " ".join(user_question.lower().split())
+        cached = responses.get(key)
+        if cached and time.monotonic() - cached[0] < RESPONSE_CACHE_TTL:
+            responses.move_to_end(key)
+            response = cached[1]
+        else:
+            response = agent.run(user_question)
+            responses[key] = (time.monotonic(), response)
+            responses.move_to_end(key)
+            if len(responses) > RESPONSE_CACHE_SIZE:
+                responses.popitem(last=False)
         response.pretty_print()
 
 if __name__ == "__main__":
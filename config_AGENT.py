@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 # Base directory for the project (this file's directory)
 BASE_DIR = os.path.dirname(__file__)
@@ -7,4 +8,11 @@ BASE_DIR = os.path.dirname(__file__)
 LOG_PATH = os.path.join(BASE_DIR, "logs", "tableau_agent")
 
 # Tableau Dashboard Configuration
-TABLEAU_DASHBOARD_URL = 'https://insights.cuny.edu/t/CUNYGuest/views/CUNYRegisteredProgramsInventory/ProgramCount?%3Aembed=y&%3AisGuestRedirectFromVizportal=y'
\ No newline at end of file
+TABLEAU_DASHBOARD_URL = 'https://insights.cuny.edu/t/CUNYGuest/views/CUNYRegisteredProgramsInventory/ProgramCount?%3Aembed=y&%3AisGuestRedirectFromVizportal=y'
+
+# Run Chromium headless; set TABLEAU_HEADLESS=0 to watch the agent drive a visible browser
+HEADLESS = os.getenv("TABLEAU_HEADLESS", "1") != "0"
+
+# Chromium profile root; pooled browsers reuse its browser-<n> profiles (each claimed through
+# a browser-<n>.lock file), so Tableau's scripts and styles stay in the disk cache between runs
+PW_PROFILE_DIR = os.getenv("TABLEAU_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "tableau_agent_profile"))
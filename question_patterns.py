@@ -0,0 +1,77 @@
+"""Question-parsing tables and helpers shared by both Tableau dashboard agents."""
+import re
+from functools import lru_cache
+
+# Common truncation patterns and their expansions, in priority order
+_EXPANSIONS = {
+    "show me data for bachelor": "show me data for bachelor's programs",
+    "show me data for master": "show me data for master's programs",
+    "show me data for associate": "show me data for associate programs",
+    "show me data for certificate": "show me data for certificate programs",
+    "how many bachelor": "how many bachelor's programs",
+    "how many master": "how many master's programs",
+    "how many associate": "how many associate programs",
+    "how many certificate": "how many certificate programs",
+    "filter by college": "filter by college and show results",
+    "filter by degree": "filter by degree level and show results",
+    "filter by program": "filter by program type and show results",
+    "compare data": "compare data across different categories",
+    "show me trends": "show me trends in the data over time",
+    "show me charts": "show me charts and visualizations",
+    "show me graphs": "show me graphs and charts"
+}
+_EXPANSION_ORDER = {truncated: i for i, truncated in enumerate(_EXPANSIONS)}
+# Lookahead so overlapping patterns are all reported, longest first at each position
+_EXPANSION_RE = re.compile('(?=(%s))' % '|'.join(map(re.escape, sorted(_EXPANSIONS, key=len, reverse=True))))
+
+# Each location pattern with the suffix words it needs; the cheap substring test
+# skips the backtracking name scan for questions that cannot match
+_LOCATION_RES = (
+    (re.compile(r'\b([a-z]+(?:\s+[a-z]+)*)\s+(?:college|university|school|institution)\b'),
+     ('college', 'university', 'school', 'institution')),
+    (re.compile(r'\b([a-z]+(?:\s+[a-z]+)*)\s+(?:city|state|county)\b'),
+     ('city', 'state', 'county'))
+)
+
+# Time expressions as one alternation; _TIME_KINDS gives their priority order
+_TIME_RE = re.compile(r'\b(?:(?P<year>20\d{2})|(?P<recency>current|recent|latest)|(?P<relative>last\s+year|this\s+year))\b')
+_TIME_KINDS = ('year', 'recency', 'relative')
+
+
+@lru_cache(maxsize=1024)
+def expand_truncated_question(question, question_lower=None):
+    """Expand truncated questions to their likely full form"""
+    if question_lower is None:
+        question_lower = question.lower()
+
+    # Check for exact matches first
+    expanded = _EXPANSIONS.get(question_lower)
+    if expanded:
+        return expanded
+
+    # Check for partial matches; the earliest-listed pattern wins, wherever it occurs
+    matches = [match.group(1) for match in _EXPANSION_RE.finditer(question_lower)]
+    if matches:
+        return _EXPANSIONS[min(matches, key=_EXPANSION_ORDER.__getitem__)]
+
+    # If no match found, return original question
+    return question
+
+def find_location(question_lower):
+    """Return a title-cased "<name> college/city/..." phrase from the question, or None"""
+    for pattern, suffixes in _LOCATION_RES:
+        if not any(suffix in question_lower for suffix in suffixes):
+            continue
+        match = pattern.search(question_lower)
+        if match:
+            return match.group(1).title()
+    return None
+
+def find_time_expression(text):
+    """Return the highest-priority time expression in text, scanning it once"""
+    found = {}
+    for match in _TIME_RE.finditer(text):
+        if match.lastgroup == _TIME_KINDS[0]:
+            return match.group()
+        found.setdefault(match.lastgroup, match.group())
+    return next((found[kind] for kind in _TIME_KINDS if kind in found), None)
@@ -1,6 +1,7 @@
 import streamlit as st
 import asyncio
 import os
+import threading
 import time
 from datetime import datetime
 import base64
@@ -63,6 +64,17 @@ def get_agent():
         st.error(f"Failed to initialize agent: {str(e)}")
         return None
 
+@st.cache_resource
+def get_event_loop():
+    """Run agent coroutines on one long-lived loop instead of starting a loop per question"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+def run_async(coro):
+    """Run a coroutine on the shared event loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
 def display_sample_questions():
     """Display sample questions in the sidebar"""
     st.sidebar.header("💡 Sample Questions")
@@ -113,14 +125,14 @@ def process_user_question(prompt):
     
     try:
         # Run the async analysis
-        result = asyncio.run(agent.analyze_dashboard(prompt))
+        result = run_async(agent.analyze_dashboard(prompt))
         
         if "error" in result:
             error_msg = f"❌ **Error:** {result['error']}"
             return error_msg, None, None
         
         # Analyze the data
-        analysis = asyncio.run(agent.analyze_dashboard_data(prompt, result))
+        analysis = run_async(agent.analyze_dashboard_data(prompt, result))
         
         # Prepare metadata
         metadata = {